@@ -1,18 +1,24 @@
+import logging
 import os
-import pandas as pd
-from flask import Flask, request, redirect, url_for, render_template, flash, send_file, jsonify
+from flask import Flask, request, redirect, url_for, render_template, flash, send_file, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import shutil
 from dotenv import load_dotenv
-from updated import get_user_data_and_update_csv,get_user_data_give_response
+from updated import get_user_data_and_update_csv,get_user_data_give_response,stream_user_data_give_response
 from graphcolor import get_graph
+from graph_store import compact_workspace, reset_workspace
+from ingest import ingest_csv
+from prompt_cache import prompt_cache
 from flask import send_file
-import zipfile, io
+import zipfile, io, json
 from flask import session
 
 
 load_dotenv()
 
+# Model token usage is logged at INFO by llm_clients
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
 app.config['UPLOAD_FOLDER'] = 'uploaded_files'
@@ -52,57 +58,50 @@ def upload_folder():
         file_path = os.path.join(folder_path, existing_file)
         if os.path.isfile(file_path):
             os.remove(file_path)
+    reset_workspace(folder_path)
 
-    nodes_file, edges_file, image_file = None, None, None
+    nodes_report, edges_report, image_file = None, None, None
 
     for file in files:
         filename = secure_filename(file.filename)
         file_path = os.path.join(folder_path, filename)
         file.save(file_path)
 
-        # Check if the file is a CSV and classify it based on its content
+        # Check if the file is a CSV and classify it from its header row;
+        # the body of nodes/edges files is validated in the same read
         if filename.endswith('.csv'):
-            df = pd.read_csv(file_path)
-            if all(column in df.columns for column in ['ID', 'Type', 'XCoordinate', 'YCoordinate']):  # Nodes file columns
-                nodes_file = file_path
-            elif all(column in df.columns for column in ['ID', 'RunID', 'Type', 'StartNode', 'EndNode']):  # Edges file columns
-                edges_file = file_path
+            report = ingest_csv(file_path)
+            if report.kind == 'nodes':
+                nodes_report = report
+            elif report.kind == 'edges':
+                edges_report = report
         elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
             image_file = filename
 
-    if not nodes_file or not edges_file:
+    if not nodes_report or not edges_report:
         flash('Both nodes and edges CSV files are required in the uploaded folder.')
         return redirect(url_for('upload_nodes_form'))
 
-    # Rename the files to standardized names
-    os.rename(nodes_file, os.path.join(folder_path, 'csvs_nodes.csv'))
-    os.rename(edges_file, os.path.join(folder_path, 'csvs_edges.csv'))
-
-    if not validate_nodes_csv(os.path.join(folder_path, 'csvs_nodes.csv')):
+    if nodes_report.missing_columns:
         flash('The nodes CSV file does not contain the required columns.')
         return redirect(url_for('upload_nodes_form'))
 
-    if not validate_edges_csv(os.path.join(folder_path, 'csvs_edges.csv')):
+    if edges_report.missing_columns:
         flash('The edges CSV file does not contain the required columns.')
         return redirect(url_for('upload_nodes_form'))
 
-    flash('Folder uploaded successfully!')
-    return redirect(url_for('prompt', folder=folder_path, image_file=image_file))
+    # Rename the files to standardized names and snapshot them from what was already read
+    for report, standard_name in ((nodes_report, 'csvs_nodes.csv'), (edges_report, 'csvs_edges.csv')):
+        standard_path = os.path.join(folder_path, standard_name)
+        os.rename(report.path, standard_path)
+        report.write_snapshot(standard_path)
 
+    for warning in nodes_report.warnings() + edges_report.warnings():
+        flash(f'Warning: {warning}')
 
-def validate_nodes_csv(filepath):
-    required_columns = ['ID', 'Type', 'XCoordinate', 'YCoordinate', 'DrawingID', 'Subtype', 
-                        'ItemTag', 'TagPrefix', 'TagSequenceNo', 'TagSuffix', 
-                        'MeasuredVariableCode', 'InstrumentTypeModifier', 'LoopFunction', 
-                        'LoopTagSequenceNo', 'Symbol']
-    df = pd.read_csv(filepath)
-    return all(col in df.columns for col in required_columns)
+    flash('Folder uploaded successfully!')
+    return redirect(url_for('prompt', folder=folder_path, image_file=image_file))
 
-def validate_edges_csv(filepath):
-    required_columns = ['ID', 'RunID', 'Type', 'StartNode', 'EndNode', 
-                        'FlowDir', 'DrawingID', 'ItemTag']
-    df = pd.read_csv(filepath)
-    return all(col in df.columns for col in required_columns)
 
 from flask import send_from_directory
 
@@ -137,19 +136,56 @@ def prompt():
             break
     
     return render_template('index3.html', folder=folder, image_file=image_file)
+def workspace_files(folder):
+    """Paths of the nodes and edges CSV files of an uploaded folder, or (None, None) if they are missing."""
+    if not folder:
+        return None, None
+    nodes_csv = os.path.join(folder, 'csvs_nodes.csv')
+    edges_csv = os.path.join(folder, 'csvs_edges.csv')
+    if not os.path.exists(nodes_csv) or not os.path.exists(edges_csv):
+        return None, None
+    return nodes_csv, edges_csv
+
 @app.route('/get_model_response', methods=['POST'])
 def get_model_response():
     data = request.json
     prompt = data.get('prompt')
     api_key = session.get('api_key')
+    nodes_csv, edges_csv = workspace_files(data.get('folder'))  # Lets simple prompts skip the model
     
     # Call the model and get its response
-    model_response = get_user_data_give_response(prompt, api_key)
-    
+    model_response = get_user_data_give_response(prompt, api_key, nodes_csv, edges_csv)
+    return jsonify(model_response_reply(model_response))
+
+
+def model_response_reply(model_response):
+    """The JSON reply of /get_model_response for a get_user_data_give_response result."""
     if model_response['result'] == 'success':
-        return jsonify({'status': 'success', 'response': model_response['message']})
+        return {'status': 'success', 'response': model_response['message'], 'token': model_response.get('token')}
     else:
-        return jsonify({'status': 'error', 'message': model_response['message']})
+        return {'status': 'error', 'message': model_response['message']}
+
+
+@app.route('/stream_model_response')
+def stream_model_response():
+    """
+    Server-Sent Events version of /get_model_response.
+
+    Sends 'text' events with pieces of the confirmation as the model generates
+    them, then one 'result' event with the same JSON /get_model_response returns.
+    """
+    prompt = request.args.get('prompt')
+    api_key = session.get('api_key')
+    nodes_csv, edges_csv = workspace_files(request.args.get('folder'))
+
+    def events():
+        for kind, data in stream_user_data_give_response(prompt, api_key, nodes_csv, edges_csv):
+            if kind == 'result':
+                data = model_response_reply(data)
+            yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 
@@ -158,6 +194,7 @@ def update_csv():
     data = request.get_json()
     prompt = data.get('prompt')
     folder = data.get('folder')
+    token = data.get('token')  # Operation planned while confirming the prompt, if any
     api_key = session.get('api_key')  # Retrieve the stored API key
 
     if not api_key:
@@ -174,7 +211,7 @@ def update_csv():
     
 
     #count_row(nodes_csv)
-    result = get_user_data_and_update_csv(prompt, nodes_csv, edges_csv,api_key)
+    result = get_user_data_and_update_csv(prompt, nodes_csv, edges_csv,api_key, token)
     print(result)
     return jsonify(result)
 
@@ -186,6 +223,10 @@ def update_csv():
     # except Exception as e:
     #     return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/prompt_cache_stats')
+def prompt_cache_stats():
+    return jsonify(prompt_cache.stats())
+
 @app.route('/generate_graph', methods=['POST'])
 def generate_graph():
     data = request.get_json()
@@ -251,6 +292,7 @@ def upload_another():
 
     if folder and os.path.exists(folder):
         shutil.rmtree(folder)
+        reset_workspace(folder)
 
     graph_filename = f'graph_{os.path.basename(folder)}.png'
     graph_output_path = os.path.join('static', 'graphs', graph_filename)
@@ -293,6 +335,9 @@ def download_csvs():
     nodes_path = os.path.join('uploaded_files', 'csvs_nodes.csv')
     edges_path = os.path.join('uploaded_files', 'csvs_edges.csv')
 
+    # Make sure journaled edits are part of the downloaded files
+    compact_workspace('uploaded_files')
+
     # Check if files exist
     if not os.path.exists(nodes_path):
         return "CSV nodes file not found.", 404
@@ -341,6 +386,7 @@ def clear_directories():
             file_path = os.path.join(upload_folder, file)
             if os.path.isfile(file_path):
                 os.remove(file_path)
+        reset_workspace(upload_folder)
     
     # Clear static/graphs
     graphs_folder = os.path.join('static', 'graphs')
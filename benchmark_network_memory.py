@@ -0,0 +1,115 @@
+"""
+Memory benchmark for the Network element classes.
+
+Builds the same synthetic drawing with the previous dict-based classes, with
+the __slots__ Node/Edge classes from updated.py without interning, and with
+them as they are (__slots__ and interned strings), and prints the memory each
+one holds, as measured by tracemalloc. The rows are created inside the
+measured region, like strings read from the CSV files, so the copies that
+interning lets go of are not counted.
+
+Usage:
+    python benchmark_network_memory.py [number_of_nodes]
+"""
+import random
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+import updated
+from updated import Edge, Node
+
+
+class LegacyNode:
+    """Node as it was before __slots__: one __dict__ and one list per instance."""
+
+    def __init__(self, id, element_type, item_tag, x, y, drawing_id, tag_prefix, tag_sequence_no, tag_suffix, tag_measuredVariable, tag_InstrumentTypeModifier):
+        self.id = id
+        self.element_type = element_type
+        self.item_tag = item_tag
+        self.x = x
+        self.y = y
+        self.tag_prefix = tag_prefix
+        self.tag_sequence_no = tag_sequence_no
+        self.tag_suffix = tag_suffix
+        self.tag_measuredVariable = tag_measuredVariable
+        self.tag_InstrumentTypeModifier = tag_InstrumentTypeModifier
+        self.drawing_id = drawing_id
+        self.connections = []
+
+
+class LegacyEdge:
+    def __init__(self, id, run_id, start_node, end_node, edge_type, flow_dir='StartNode to EndNode'):
+        self.id = id
+        self.run_id = run_id
+        self.start_node = start_node
+        self.end_node = end_node
+        self.flow_dir = flow_dir
+        self.edge_type = edge_type
+
+
+TYPES = ['Valve', 'Pump', 'Instrument', 'Nozzle', 'Junction', 'Piping Component', 'Equipment']
+
+
+def node_rows(node_count):
+    """Node values as they come out of the CSV file: fresh strings for every row."""
+    rng = random.Random(0)
+    for index in range(node_count):
+        element_type = rng.choice(TYPES)
+        prefix = ''.join(word[:3].upper() for word in element_type.split())
+        yield (f"GENAINODE-{index:08d}", ''.join(list(element_type)), f"{prefix}-{index}",
+               rng.random(), rng.random(), ''.join(list('DRAWING-1')), ''.join(list(prefix)),
+               index, ' ', ''.join(list(prefix[:1])), ''.join(list(prefix[1:])))
+
+
+def edge_rows(node_count):
+    """Edge values as they come out of the CSV file: fresh strings for every row."""
+    rng = random.Random(1)
+    for index in range(node_count):
+        yield (f"GENAIEDGE-{index:08d}", f"RUN{index:08d}", f"GENAINODE-{index:08d}",
+               f"GENAINODE-{rng.randrange(node_count):08d}", ''.join(list('Piping')),
+               ''.join(list('StartNode to EndNode')))
+
+
+@contextmanager
+def without_interning():
+    """Make Node and Edge keep the strings they are given, to measure __slots__ alone."""
+    intern_text = updated.intern_text
+    updated.intern_text = lambda value: value
+    try:
+        yield
+    finally:
+        updated.intern_text = intern_text
+
+
+def measure(node_class, edge_class, node_count):
+    """Bytes still held after reading node_count node and edge rows into the given classes."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    built_nodes = {values[0]: node_class(*values) for values in node_rows(node_count)}
+    built_edges = {values[0]: edge_class(*values) for values in edge_rows(node_count)}
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built_nodes, built_edges
+    return after - before
+
+
+def main():
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    legacy = measure(LegacyNode, LegacyEdge, node_count)
+    with without_interning():
+        slots = measure(Node, Edge, node_count)
+    compact = measure(Node, Edge, node_count)
+
+    print(f"{node_count} nodes and {node_count} edges")
+    for label, size in (("dict-based classes:", legacy),
+                        ("__slots__ classes:", slots),
+                        ("__slots__ + interning:", compact)):
+        print(f"  {label:23} {size / 2**20:8.1f} MiB  ({size / node_count:6.0f} bytes per node+edge)")
+    print(f"  saved by __slots__: {(1 - slots / legacy) * 100:.0f}%, "
+          f"by interning on top: {(1 - compact / slots) * 100:.0f}%, total: {(1 - compact / legacy) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
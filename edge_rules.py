@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+# Edge type for a pair of element types, looked up with the pair sorted
+EDGE_RULES = {
+    ('instrument', 'instrument'): 'Signal',
+    ('instrument', 'junction'): 'Piping',
+    ('instrument', 'nozzle'): 'Signal',
+    ('instrument', 'piping component'): 'Piping',
+    ('junction', 'instrument'): 'ConnectToProcess',
+    ('junction', 'junction'): 'Piping',
+    ('junction', 'opc'): 'Piping',
+    ('junction', 'piping component'): 'Piping',
+    ('junction', 'unknown'): 'Piping',
+    ('nozzle', 'equipment'): 'DirectConnection',  # Rule for nozzle and equipment
+    ('nozzle', 'instrument'): 'Signal',
+    ('nozzle', 'nozzle'): 'Signal',
+    ('nozzle', 'piping component'): 'Piping',
+    ('opc', 'junction'): 'Piping',
+    ('piping component', 'instrument'): 'Piping',
+    ('piping component', 'junction'): 'Piping',
+    ('piping component', 'nozzle'): 'Piping',
+    ('piping component', 'opc'): 'Piping',
+    ('piping component', 'piping component'): 'Piping',
+    ('pump', 'valve'): 'Piping',
+    ('pump', 'cooler'): 'Piping',
+    ('cooler', 'valve'): 'Direct connection',
+}
+DEFAULT_EDGE_TYPE = 'Piping'
+
+# Element types that appear in a rule get codes 1..n; every other type is 0
+ELEMENT_TYPE_CODES = {name: code for code, name in enumerate(sorted({name for pair in EDGE_RULES for name in pair}), start=1)}
+EDGE_TYPE_NAMES = np.array([DEFAULT_EDGE_TYPE] + sorted(set(EDGE_RULES.values()) - {DEFAULT_EDGE_TYPE}), dtype=object)
+
+
+def build_rule_matrix():
+    """
+    Square matrix of edge type codes indexed by (start type code, end type code).
+
+    Each cell holds what the rule lookup gives for that pair: the pair is
+    sorted and looked up in EDGE_RULES, falling back to DEFAULT_EDGE_TYPE.
+    Row and column 0 (types without a rule) are all the default.
+    """
+    edge_type_codes = {name: code for code, name in enumerate(EDGE_TYPE_NAMES.tolist())}
+    names = {code: name for name, code in ELEMENT_TYPE_CODES.items()}
+    size = len(ELEMENT_TYPE_CODES) + 1
+    matrix = np.zeros((size, size), dtype=np.int8)
+    for code1, name1 in names.items():
+        for code2, name2 in names.items():
+            edge_type = EDGE_RULES.get(tuple(sorted([name1, name2])), DEFAULT_EDGE_TYPE)
+            matrix[code1, code2] = edge_type_codes[edge_type]
+    return matrix
+
+
+RULE_MATRIX = build_rule_matrix()
+
+
+def element_type_code(element_type):
+    """Integer code of an element type; case and surrounding spaces are ignored."""
+    return ELEMENT_TYPE_CODES.get(element_type.strip().lower(), 0)
+
+
+def element_type_codes(element_types):
+    """Vectorized element_type_code over a sequence of element types."""
+    normalized = pd.Series(element_types, dtype=object).fillna('').astype(str).str.strip().str.lower()
+    return normalized.map(ELEMENT_TYPE_CODES).fillna(0).to_numpy(dtype=np.intp)
+
+
+def determine_edge_type(element1, element2):
+    """Determines the edge type between two elements based on predefined rules."""
+    return EDGE_TYPE_NAMES[RULE_MATRIX[element_type_code(element1), element_type_code(element2)]]
+
+
+def determine_edge_types(start_types, end_types):
+    """
+    Determines the edge types of many edges at once.
+
+    :param start_types: Types of the start nodes, one per edge.
+    :param end_types: Types of the end nodes, one per edge.
+    :return: A list with the edge type of every edge.
+    """
+    if len(start_types) == 0:
+        return []
+    codes = RULE_MATRIX[element_type_codes(start_types), element_type_codes(end_types)]
+    return EDGE_TYPE_NAMES[codes].tolist()
+
+
+def assign_edge_types(edges, node_types):
+    """
+    Sets the 'Type' column of a whole edges DataFrame in one vectorized step.
+
+    :param edges: DataFrame with 'StartNode' and 'EndNode' columns; changed in place.
+    :param node_types: Mapping or Series of node ID -> element type. Nodes
+                       missing from it count as 'Unknown'.
+    :return: The edges DataFrame.
+    """
+    start_types = edges['StartNode'].map(node_types).fillna('Unknown')
+    end_types = edges['EndNode'].map(node_types).fillna('Unknown')
+    codes = RULE_MATRIX[element_type_codes(start_types), element_type_codes(end_types)]
+    edges['Type'] = EDGE_TYPE_NAMES[codes]
+    return edges
@@ -0,0 +1,683 @@
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from snapshot import read_rows, write_snapshot_rows
+from spatial_index import BoundedGrid, SpatialGrid
+
+
+NODES_FILENAME = 'csvs_nodes.csv'
+EDGES_FILENAME = 'csvs_edges.csv'
+JOURNAL_FILENAME = 'csvs_journal.jsonl'
+
+# Number of journaled changes after which they are folded back into the CSV files
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv('JOURNAL_COMPACT_THRESHOLD', 500))
+
+# Most changed node rows compaction patches in place; beyond this it rewrites the whole file
+PATCH_ROW_THRESHOLD = int(os.getenv('PATCH_ROW_THRESHOLD', 64))
+
+CSV_LINE_TERMINATOR = '\r\n'  # What csv.writer uses by default
+
+# Positions of new nodes remembered per drawing for placement checks; older ones are forgotten
+PLACEMENT_MEMORY_LIMIT = int(os.getenv('PLACEMENT_MEMORY_LIMIT', 1000))
+
+
+class TransactionAborted(Exception):
+    """Raised inside GraphStore.transaction() to discard every change made in it."""
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_csv_rows(path):
+    """
+    Read a CSV file into its header and an iterator of row dictionaries.
+
+    The binary snapshot of the file is used when it is fresh. Missing trailing
+    cells are filled with empty strings so every row has a value for every column.
+    """
+    return read_rows(path)
+
+
+def serialize_row(fieldnames, row, line_terminator=CSV_LINE_TERMINATOR):
+    """Encode one row dictionary exactly as csv.DictWriter would write it."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, restval='', extrasaction='ignore', lineterminator=line_terminator)
+    writer.writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def write_csv_rows(path, fieldnames, rows):
+    """
+    Write a header and row dictionaries to a CSV file.
+
+    The rows are written to a temporary file in the same folder which then
+    replaces the original, so a crash never leaves a half-written CSV behind.
+    The file's binary snapshot is regenerated afterwards.
+
+    Returns:
+        list: (byte offset, byte length) of every row in the new file.
+    """
+    rows = list(rows)
+    offsets = []
+    temp_path = f"{path}.tmp"
+    with open(temp_path, mode='wb') as csvfile:
+        offset = csvfile.write(serialize_row(fieldnames, dict(zip(fieldnames, fieldnames))))
+        for row in rows:
+            data = serialize_row(fieldnames, row)
+            csvfile.write(data)
+            offsets.append((offset, len(data)))
+            offset += len(data)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    os.replace(temp_path, path)
+    # Refresh the binary snapshot from the rows we already have in memory
+    write_snapshot_rows(path, fieldnames, rows)
+    return offsets
+
+
+def scan_row_offsets(path):
+    """
+    Find where each data row of a CSV file sits, without parsing the values.
+
+    Returns:
+        tuple: (line terminator, [(byte offset, byte length), ...]) with one
+               entry per non-blank data row, in file order.
+    """
+    with open(path, mode='rb') as csvfile:
+        data = csvfile.read()
+    first_newline = data.find(b'\n')
+    line_terminator = '\r\n' if first_newline > 0 and data[first_newline - 1:first_newline] == b'\r' else '\n'
+
+    offsets = []
+    record_start, quotes, position = None, 0, 0
+    for line in io.BytesIO(data):
+        if record_start is None:
+            record_start, quotes = position, 0
+        quotes += line.count(b'"')
+        position += len(line)
+        if quotes % 2 == 0:  # Quoted fields can span lines; a record ends once its quotes are balanced
+            if line.strip(b'\r\n') or position - record_start > len(line):
+                offsets.append((record_start, position - record_start))
+            record_start = None
+    return line_terminator, offsets[1:]  # Drop the header
+
+
+def parse_coordinates(row):
+    """Return the (x, y) coordinates of a node row, or None if they are missing or invalid."""
+    x, y = row.get('XCoordinate'), row.get('YCoordinate')
+    if not x or not y:
+        return None
+    try:
+        return float(x), float(y)
+    except (TypeError, ValueError):
+        return None
+
+
+class GraphStore:
+    """
+    In-memory copy of one workspace's nodes and edges CSV files.
+
+    The store is loaded once and indexed by node ID, ItemTag, adjacency and node
+    position (a SpatialGrid) so that the edit helpers in updated.py never have to
+    rescan the CSV files.
+
+    Every change is recorded as an entry of an append-only journal kept next to
+    the CSV files (csvs_journal.jsonl). flush(), which operation() calls once when
+    the outermost operation finishes, only appends the new entries to it. Once the
+    journal reaches JOURNAL_COMPACT_THRESHOLD entries, or when something needs the
+    CSV files themselves, compact() rewrites them from memory and empties the
+    journal. Loading replays any journal left over from a previous process.
+    """
+
+    def __init__(self, nodes_csv, edges_csv):
+        self.nodes_csv = nodes_csv
+        self.edges_csv = edges_csv
+        self.journal_path = os.path.join(os.path.dirname(nodes_csv), JOURNAL_FILENAME)
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.version = 0  # bumped on every load and change, so caches built on the store can tell they are stale
+        # DrawingID -> BoundedGrid of positions recently handed out to new nodes; kept across reloads
+        # and rollbacks, and only dropped with the store by reset_workspace()
+        self.placements = {}
+        self.load()
+
+    def load(self):
+        """(Re)load both CSV files, replay the journal and rebuild every index."""
+        self.node_fields, node_rows = read_csv_rows(self.nodes_csv)
+        self.edge_fields, edge_rows = read_csv_rows(self.edges_csv)
+        self.node_id_field = self.node_fields[0] if self.node_fields else 'ID'
+        self.edge_id_field = self.edge_fields[0] if self.edge_fields else 'ID'
+
+        self.nodes = {}          # node key (normally the node ID) -> row
+        self.grid = SpatialGrid()
+        self.coords = self.grid.points  # node key -> (x, y)
+        self.tags = {}           # normalized ItemTag -> {node key: None}, first indexed first
+        for row in node_rows:
+            self.index_node(row)
+
+        self.edges = {}          # edge key (normally the edge ID) -> row
+        self.outgoing = {}       # node ID -> {edge key: None} of edges starting at the node
+        self.incoming = {}       # node ID -> {edge key: None} of edges ending at the node
+        for row in edge_rows:
+            self.index_edge(row)
+
+        self.pending = []        # journal entries not written yet
+        self.nodes_changed = False  # a node was added or removed, or a column added: rewrite the file
+        self.patched_nodes = {}     # node key -> None for rows only updated since the last compaction
+        self.row_offsets = None     # (line terminator, {node key: (byte offset, byte length)}), found lazily
+        self.edges_changed = False
+        self.journal_offset = 0     # bytes of the journal applied so far
+        self.journal_entries = self.replay_journal()
+        self.signature = self.current_signature()
+        self.version += 1
+
+    def current_signature(self):
+        return file_signature(self.nodes_csv), file_signature(self.edges_csv), file_signature(self.journal_path)
+
+    def refresh(self):
+        """Pick up changes made on disk outside of the store, e.g. by another worker process."""
+        with self.lock:
+            if self.depth or self.pending:
+                return
+            self.catch_up()
+
+    def catch_up(self):
+        """
+        Bring the store up to date with the files, keeping the changes not written yet.
+
+        Entries another process appended to the journal are replayed. If the
+        CSV files were rewritten (another process compacted) or the journal
+        shrank, everything is reloaded and the pending entries are applied
+        again on top.
+        """
+        signature = self.current_signature()
+        if signature == self.signature:
+            return
+        journal = signature[2]
+        if signature[:2] != self.signature[:2] or journal is None or journal[1] < self.journal_offset:
+            pending = self.pending
+            self.load()
+            for entry in pending:
+                self.apply_entry(entry)
+            self.pending = pending
+        else:
+            self.journal_entries += self.replay_journal()
+            self.signature = signature
+            self.version += 1
+
+    @contextmanager
+    def operation(self):
+        """
+        Group several changes into one operation.
+
+        Operations may be nested; the changes are flushed once, when the
+        outermost operation exits.
+        """
+        with self.lock:
+            if self.depth == 0:
+                self.refresh()
+            self.depth += 1
+            try:
+                yield self
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.flush()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several changes into an all-or-nothing operation.
+
+        The changes are only made in memory until the block ends. If it exits
+        normally they are flushed once, like operation(). If it raises,
+        including TransactionAborted, they are discarded and the store goes
+        back to what is on disk. A transaction nested in another operation
+        is part of that operation and cannot be rolled back on its own.
+        """
+        with self.lock:
+            if self.depth:
+                with self.operation():
+                    yield self
+                return
+            self.refresh()
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.depth -= 1
+                self.rollback()
+                raise
+            self.depth -= 1
+            self.flush()
+
+    def rollback(self):
+        """Drop the changes that were not flushed yet and reload the committed state."""
+        with self.lock:
+            self.pending = []
+            self.load()
+
+    def pending_problems(self):
+        """
+        Check the changes that are not flushed yet for broken references.
+
+        Only the pending entries are looked at, so the cost depends on the
+        number of changes and not on the size of the drawing.
+
+        Returns:
+            list: Descriptions of the problems found; empty if there are none.
+        """
+        problems = []
+        for entry in self.pending:
+            key = entry.get('key')
+            # New edges, and edges moved to other nodes; updating other columns of an edge checks nothing
+            moved = entry['op'] == 'update_edge' and ('StartNode' in entry['values'] or 'EndNode' in entry['values'])
+            if (entry['op'] == 'add_edge' or moved) and key in self.edges:
+                edge = self.edges[key]
+                for end in ('StartNode', 'EndNode'):
+                    if edge.get(end) not in self.nodes:
+                        problems.append(f"Edge {key} refers to missing node {edge.get(end)!r}.")
+            elif entry['op'] == 'remove_node' and key not in self.nodes and self.degree(key):
+                problems.append(f"Removed node {key} still has edges.")
+        return problems
+
+    # Journal
+
+    def record(self, entry):
+        self.pending.append(entry)
+        self.version += 1
+        self.mark_changed(entry)
+
+    def mark_changed(self, entry):
+        """Note which file an entry changes, and whether the nodes file can just be patched."""
+        if entry['op'].endswith('edge'):
+            self.edges_changed = True
+        elif entry['op'] == 'update_node':
+            self.patched_nodes[entry['key']] = None
+        else:
+            self.nodes_changed = True
+
+    def write_journal(self):
+        """Append the pending entries to the journal file, after those other processes appended."""
+        self.catch_up()
+        if not self.pending:
+            return
+        with open(self.journal_path, mode='ab') as journal:
+            journal.write(''.join(json.dumps(entry) + '\n' for entry in self.pending).encode('utf-8'))
+            journal.flush()
+            os.fsync(journal.fileno())
+            self.journal_offset = journal.tell()
+        self.journal_entries += len(self.pending)
+        self.pending = []
+        self.signature = self.current_signature()
+
+    def replay_journal(self):
+        """Apply the journal entries after journal_offset on top of the current contents."""
+        if not os.path.exists(self.journal_path):
+            return 0
+        entries = 0
+        with open(self.journal_path, mode='rb') as journal:
+            journal.seek(self.journal_offset)
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Incomplete last line of an interrupted write, or one still being written
+                self.apply_entry(entry)
+                self.journal_offset += len(line)
+                entries += 1
+        return entries
+
+    def apply_entry(self, entry):
+        """
+        Apply one journal entry without recording it again.
+
+        Entries are idempotent, so replaying a journal whose changes already
+        reached the CSV files (a crash during compaction) is harmless.
+        """
+        op, key = entry['op'], entry.get('key')
+        if op == 'add_node':
+            if key in self.nodes:
+                self.update_node_row(key, entry['row'])
+            else:
+                self.index_node(dict(entry['row']), key)
+        elif op == 'update_node' and key in self.nodes:
+            self.update_node_row(key, entry['values'])
+        elif op == 'remove_node' and key in self.nodes:
+            self.drop_node_indexes(key, self.nodes.pop(key))
+        elif op == 'add_node_field':
+            self.add_node_field(entry['field'])
+        elif op == 'add_edge':
+            if key in self.edges:
+                self.unindex_edge(key)
+            self.index_edge(dict(entry['row']), key)
+        elif op == 'update_edge' and key in self.edges:
+            self.update_edge_row(key, entry['values'])
+        elif op == 'remove_edge' and key in self.edges:
+            self.unindex_edge(key)
+        self.mark_changed(entry)
+
+    def flush(self):
+        """Journal the pending changes, compacting once the journal has grown large."""
+        with self.lock:
+            self.write_journal()
+            if self.journal_entries >= JOURNAL_COMPACT_THRESHOLD:
+                self.compact()
+
+    def compact(self):
+        """
+        Rewrite the CSV files from memory and empty the journal.
+
+        Each file is replaced atomically, and the journal is only cleared after
+        both files are in place.
+        """
+        with self.lock:
+            self.write_journal()
+            if self.nodes_changed or self.patched_nodes:
+                if (self.nodes_changed or len(self.patched_nodes) > PATCH_ROW_THRESHOLD
+                        or not self.patch_node_rows()):
+                    offsets = write_csv_rows(self.nodes_csv, self.node_fields, self.nodes.values())
+                    self.row_offsets = (CSV_LINE_TERMINATOR, dict(zip(self.nodes, offsets)))
+                self.nodes_changed = False
+                self.patched_nodes = {}
+            if self.edges_changed:
+                write_csv_rows(self.edges_csv, self.edge_fields, self.edges.values())
+                self.edges_changed = False
+            if self.journal_entries or os.path.exists(self.journal_path):
+                open(self.journal_path, mode='w').close()
+                self.journal_entries = 0
+                self.journal_offset = 0
+            self.signature = self.current_signature()
+
+    def patch_node_rows(self):
+        """
+        Overwrite the updated node rows inside the CSV file instead of rewriting it.
+
+        This only works when no node was added or removed since the file was
+        written, so rows still sit where they were, and when every updated row
+        encodes to exactly as many bytes as before. Otherwise nothing is
+        written and False is returned.
+
+        The full rows are journaled before the file is touched. If a patch is
+        interrupted, replaying the journal restores every column of the rows.
+        """
+        if self.row_offsets is None:
+            line_terminator, offsets = scan_row_offsets(self.nodes_csv)
+            if len(offsets) != len(self.nodes):
+                return False
+            self.row_offsets = (line_terminator, dict(zip(self.nodes, offsets)))
+        line_terminator, offsets = self.row_offsets
+
+        patches = []
+        for key in self.patched_nodes:
+            if key not in offsets or key not in self.nodes:
+                return False
+            offset, length = offsets[key]
+            data = serialize_row(self.node_fields, self.nodes[key], line_terminator)
+            if len(data) != length:
+                return False
+            patches.append((offset, data))
+
+        self.pending = [{'op': 'add_node', 'key': key, 'row': self.nodes[key]} for key in self.patched_nodes]
+        self.write_journal()
+        with open(self.nodes_csv, mode='r+b') as csvfile:
+            for offset, data in patches:
+                csvfile.seek(offset)
+                csvfile.write(data)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        write_snapshot_rows(self.nodes_csv, self.node_fields, self.nodes.values())
+        return True
+
+    # Placement memory
+
+    def remember_placement(self, drawing_id, x, y):
+        """Reserve a position handed out to a new node of a drawing, so later placements keep clear of it."""
+        self.placements.setdefault(drawing_id or '', BoundedGrid(PLACEMENT_MEMORY_LIMIT)).add(x, y)
+
+    def placement_obstacles(self, drawing_id, min_x, min_y, max_x, max_y):
+        """Positions of nodes, and of placements remembered for the drawing, in the cells overlapping a box."""
+        obstacles = self.grid.points_in_box(min_x, min_y, max_x, max_y)
+        memory = self.placements.get(drawing_id or '')
+        if memory:
+            obstacles.extend(memory.points_in_box(min_x, min_y, max_x, max_y))
+        return obstacles
+
+    # Nodes
+
+    def index_node(self, row, key=None):
+        if key is None:
+            key = unique_key(self.nodes, row.get(self.node_id_field, ''))
+        self.nodes[key] = row
+        self.add_node_indexes(key, row)
+        return key
+
+    def add_node_indexes(self, node_id, row):
+        coordinates = parse_coordinates(row)
+        if coordinates is not None:
+            self.grid.insert(node_id, *coordinates)
+        item_tag = normalize_tag(row.get('ItemTag'))
+        if item_tag:
+            self.tags.setdefault(item_tag, {})[node_id] = None
+
+    def drop_node_indexes(self, node_id, row):
+        self.grid.remove(node_id)
+        item_tag = normalize_tag(row.get('ItemTag'))
+        node_ids = self.tags.get(item_tag)
+        if node_ids is not None:
+            node_ids.pop(node_id, None)
+            if not node_ids:
+                del self.tags[item_tag]
+
+    def update_node_row(self, node_id, values):
+        row = self.nodes[node_id]
+        self.drop_node_indexes(node_id, row)
+        row.update(values)
+        self.add_node_indexes(node_id, row)
+        return row
+
+    def add_node_field(self, field):
+        if field not in self.node_fields:
+            self.node_fields.append(field)
+            for row in self.nodes.values():
+                row.setdefault(field, '')
+
+    def get_node(self, node_id):
+        return self.nodes.get(node_id)
+
+    def node_ids_by_tag(self, item_tag):
+        """Return the IDs of every node with the given ItemTag (compared with normalize_tag)."""
+        return list(self.tags.get(normalize_tag(item_tag), ()))
+
+    def node_id_by_tag(self, item_tag):
+        """Return the ID of the node with the given ItemTag, or None; the first one wins on duplicates."""
+        for node_id in self.tags.get(normalize_tag(item_tag), ()):
+            return node_id
+        return None
+
+    def node_by_tag(self, item_tag):
+        """Return the row of the node with the given ItemTag, or None."""
+        node_id = self.node_id_by_tag(item_tag)
+        return self.nodes[node_id] if node_id is not None else None
+
+    def tag_index(self):
+        """Return a new dictionary of normalized ItemTag -> node ID."""
+        return {item_tag: next(iter(node_ids)) for item_tag, node_ids in self.tags.items()}
+
+    def add_node(self, values):
+        """Add a node row; columns missing from values are left empty."""
+        row = {field: '' for field in self.node_fields}
+        row.update((k, v) for k, v in values.items() if k in row)
+        key = self.index_node(row)
+        self.record({'op': 'add_node', 'key': key, 'row': row})
+        return row
+
+    def update_node(self, node_id, values):
+        """Change some columns of an existing node, keeping its row position."""
+        row = self.update_node_row(node_id, values)
+        self.record({'op': 'update_node', 'key': node_id, 'values': dict(values)})
+        return row
+
+    def remove_node(self, node_id):
+        """Remove a node row; edges are left untouched."""
+        row = self.nodes.pop(node_id)
+        self.drop_node_indexes(node_id, row)
+        self.record({'op': 'remove_node', 'key': node_id})
+        return row
+
+    def ensure_node_field(self, field):
+        if field not in self.node_fields:
+            self.add_node_field(field)
+            self.record({'op': 'add_node_field', 'field': field})
+
+    # Edges
+
+    def index_edge(self, row, key=None):
+        if key is None:
+            key = unique_key(self.edges, row.get(self.edge_id_field, ''))
+        self.edges[key] = row
+        start, end = row.get('StartNode'), row.get('EndNode')
+        if start:
+            self.outgoing.setdefault(start, {})[key] = None
+        if end:
+            self.incoming.setdefault(end, {})[key] = None
+        return key
+
+    def unindex_edge(self, edge_key):
+        row = self.edges.pop(edge_key)
+        start, end = row.get('StartNode'), row.get('EndNode')
+        if start:
+            self.outgoing[start].pop(edge_key, None)
+        if end:
+            self.incoming[end].pop(edge_key, None)
+        return row
+
+    def add_edge(self, values):
+        """Add an edge row; columns missing from values are left empty."""
+        row = {field: '' for field in self.edge_fields}
+        row.update((k, v) for k, v in values.items() if k in row)
+        key = self.index_edge(row)
+        self.record({'op': 'add_edge', 'key': key, 'row': row})
+        return row
+
+    def update_edge(self, edge_key, values):
+        """Change some columns of an existing edge."""
+        values = {k: v for k, v in values.items() if k in self.edges[edge_key]}
+        row = self.update_edge_row(edge_key, values)
+        self.record({'op': 'update_edge', 'key': edge_key, 'values': values})
+        return row
+
+    def update_edge_row(self, edge_key, values):
+        row = self.unindex_edge(edge_key)
+        row.update(values)
+        self.index_edge(row, edge_key)
+        return row
+
+    def remove_edge(self, edge_key):
+        row = self.unindex_edge(edge_key)
+        self.record({'op': 'remove_edge', 'key': edge_key})
+        return row
+
+    def edges_of(self, node_id):
+        """Return the keys of all edges starting or ending at a node."""
+        keys = dict(self.outgoing.get(node_id, {}))
+        keys.update(self.incoming.get(node_id, {}))
+        return list(keys)
+
+    def degree(self, node_id):
+        """Number of edges starting or ending at a node (a self-loop counts twice)."""
+        return len(self.outgoing.get(node_id, ())) + len(self.incoming.get(node_id, ()))
+
+    def edges_between(self, node1_id, node2_id):
+        """Return the keys of all edges joining two nodes, in either direction."""
+        return [key for key in self.edges_of(node1_id)
+                if {self.edges[key].get('StartNode'), self.edges[key].get('EndNode')} == {node1_id, node2_id}]
+
+    def neighbours(self, node_id):
+        """Return the IDs at the other end of the node's outgoing and incoming edges."""
+        ends = [self.edges[key].get('EndNode') for key in self.outgoing.get(node_id, ())]
+        starts = [self.edges[key].get('StartNode') for key in self.incoming.get(node_id, ())]
+        return [other for other in ends + starts if other]
+
+
+def normalize_tag(item_tag):
+    """Form of an ItemTag used for every tag lookup: surrounding spaces dropped, case ignored."""
+    return str(item_tag).strip().lower() if item_tag is not None else ''
+
+
+def unique_key(table, key):
+    """Return key, or a suffixed variant of it if the table already uses it."""
+    if key not in table:
+        return key
+    counter = 1
+    while f"{key}#{counter}" in table:
+        counter += 1
+    return f"{key}#{counter}"
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def workspace_paths(nodes_csv=None, edges_csv=None):
+    """Fill in the missing nodes/edges path from the workspace folder of the other one."""
+    folder = os.path.dirname(os.path.abspath(nodes_csv or edges_csv))
+    nodes_csv = os.path.abspath(nodes_csv) if nodes_csv else os.path.join(folder, NODES_FILENAME)
+    edges_csv = os.path.abspath(edges_csv) if edges_csv else os.path.join(folder, EDGES_FILENAME)
+    return nodes_csv, edges_csv
+
+
+def get_store(nodes_csv=None, edges_csv=None):
+    """
+    Return the GraphStore of the workspace containing the given CSV files.
+
+    The store is created on first use and reloaded when the files are changed
+    on disk by something other than the store itself.
+    """
+    nodes_csv, edges_csv = workspace_paths(nodes_csv, edges_csv)
+    folder = os.path.dirname(nodes_csv)
+    with _stores_lock:
+        store = _stores.get(folder)
+        if store is None:
+            store = GraphStore(nodes_csv, edges_csv)
+            _stores[folder] = store
+            return store
+    store.refresh()
+    return store
+
+
+def reset_workspace(folder):
+    """
+    Forget the store of a workspace, e.g. after its files were replaced or deleted.
+
+    Unflushed changes and remembered placements are dropped; the next
+    get_store() loads the workspace from disk again.
+    """
+    nodes_csv, _ = workspace_paths(os.path.join(folder, NODES_FILENAME))
+    with _stores_lock:
+        _stores.pop(os.path.dirname(nodes_csv), None)
+
+
+def compact_workspace(folder):
+    """
+    Fold the journaled changes of a workspace into its CSV files.
+
+    Call this before reading csvs_nodes.csv/csvs_edges.csv directly, e.g. to
+    draw or download them.
+    """
+    nodes_csv, edges_csv = workspace_paths(os.path.join(folder, NODES_FILENAME))
+    folder = os.path.dirname(nodes_csv)
+    if folder not in _stores and not os.path.exists(os.path.join(folder, JOURNAL_FILENAME)):
+        return
+    if os.path.exists(nodes_csv) and os.path.exists(edges_csv):
+        get_store(nodes_csv, edges_csv).compact()
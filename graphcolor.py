@@ -10,12 +10,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.image import imread
 import pandas as pd
+from graph_store import compact_workspace
+from snapshot import read_frame, row_count
 
 def get_graph(path, graph_output_path):
     # Check if the path is correct
     if not os.path.exists(path):
         print(f"Path does not exist: {path}")
         return
+
+    # Fold journaled edits into the CSV files before reading them
+    compact_workspace(path)
     
     # Load PID image if it exists in 'uploaded_files' folder
     image_files = glob.glob(os.path.join(path, "*.[Pp][Nn][Gg]")) + \
@@ -41,7 +46,7 @@ def get_graph(path, graph_output_path):
     edge_list = []
 
     for filename in all_edge_files:
-        df = pd.read_csv(filename, decimal=',')
+        df = read_frame(filename)  # Binary snapshot of the CSV when it is up to date
         df.columns = df.columns.str.strip()  # Remove any leading/trailing whitespace
 
         # Automatically identify and rename the first column to "EDGEID"
@@ -69,7 +74,7 @@ def get_graph(path, graph_output_path):
 
     node_list = []
     for filename in all_node_files:
-        df = pd.read_csv(filename, decimal=',')
+        df = read_frame(filename)
         node_list.append(df)
 
     nodes = pd.concat(node_list, axis=0, ignore_index=True)
@@ -87,8 +92,9 @@ def get_graph(path, graph_output_path):
 
     # Ensure coordinates are numeric and drop nodes with missing coordinates
     nodes = nodes[nodes['XCOORDINATE'] != 'XCOORDINATE']  # Filter out invalid rows
-    nodes['XCOORDINATE'] = pd.to_numeric(nodes['XCOORDINATE'])
-    nodes['YCOORDINATE'] = pd.to_numeric(nodes['YCOORDINATE'])
+    # Accept both ',' and '.' as the decimal separator
+    nodes['XCOORDINATE'] = pd.to_numeric(nodes['XCOORDINATE'].str.replace(',', '.', regex=False))
+    nodes['YCOORDINATE'] = pd.to_numeric(nodes['YCOORDINATE'].str.replace(',', '.', regex=False))
 
     # Drop strange or invalid edges
     edges = edges[edges['EDGEID'] != 'ID']
@@ -140,8 +146,7 @@ def get_graph(path, graph_output_path):
     print(initial_row_count)
     
     # Recalculate or modify initial_row_count during execution
-    df = pd.read_csv('uploaded_files/csvs_nodes.csv')
-    final_row_count = len(df)
+    final_row_count = row_count('uploaded_files/csvs_nodes.csv')
     print(final_row_count)
 
     highlighted_nodes = nodes.iloc[initial_row_count:]
@@ -0,0 +1,122 @@
+import csv
+
+from snapshot import write_snapshot
+
+
+# Columns that identify an uploaded CSV as the nodes or the edges file
+NODES_SIGNATURE_COLUMNS = ['ID', 'Type', 'XCoordinate', 'YCoordinate']
+EDGES_SIGNATURE_COLUMNS = ['ID', 'RunID', 'Type', 'StartNode', 'EndNode']
+
+# Columns each file must contain to be accepted
+NODES_REQUIRED_COLUMNS = ['ID', 'Type', 'XCoordinate', 'YCoordinate', 'DrawingID', 'Subtype',
+                          'ItemTag', 'TagPrefix', 'TagSequenceNo', 'TagSuffix',
+                          'MeasuredVariableCode', 'InstrumentTypeModifier', 'LoopFunction',
+                          'LoopTagSequenceNo', 'Symbol']
+EDGES_REQUIRED_COLUMNS = ['ID', 'RunID', 'Type', 'StartNode', 'EndNode',
+                          'FlowDir', 'DrawingID', 'ItemTag']
+
+# Columns whose non-empty values must be numbers
+NUMERIC_COLUMNS = {'nodes': ['XCoordinate', 'YCoordinate'], 'edges': []}
+
+# How many offending values of each kind are kept for the report
+MAX_REPORTED_PROBLEMS = 5
+
+
+class IngestReport:
+    """Result of reading one uploaded CSV file."""
+
+    def __init__(self, path, kind, fieldnames):
+        self.path = path
+        self.kind = kind  # 'nodes', 'edges' or None if the file is neither
+        self.fieldnames = fieldnames
+        self.columns = [[] for _ in fieldnames]
+        self.row_count = 0
+        self.missing_columns = []
+        self.bad_values = []      # (row number, column, value) of non-numeric cells
+        self.bad_value_count = 0
+        self.duplicate_ids = []
+        self.duplicate_id_count = 0
+
+    def warnings(self):
+        """Human-readable descriptions of the data problems found in the file."""
+        messages = []
+        if self.bad_value_count:
+            examples = ', '.join(f"row {row} {column}={value!r}" for row, column, value in self.bad_values)
+            messages.append(f"{self.bad_value_count} non-numeric value(s) in the {self.kind} CSV ({examples})")
+        if self.duplicate_id_count:
+            examples = ', '.join(self.duplicate_ids)
+            messages.append(f"{self.duplicate_id_count} duplicate ID(s) in the {self.kind} CSV ({examples})")
+        return messages
+
+    def write_snapshot(self, csv_path):
+        """Write the binary snapshot of the file from the columns collected while reading it."""
+        write_snapshot(csv_path, self.fieldnames, self.columns)
+
+
+def classify_header(fieldnames):
+    """Tell from its header row whether a CSV file holds nodes, edges or neither."""
+    if all(column in fieldnames for column in NODES_SIGNATURE_COLUMNS):
+        return 'nodes'
+    if all(column in fieldnames for column in EDGES_SIGNATURE_COLUMNS):
+        return 'edges'
+    return None
+
+
+def is_number(value):
+    try:
+        float(value.replace(',', '.'))
+    except ValueError:
+        return False
+    return True
+
+
+def ingest_csv(path):
+    """
+    Classify and validate an uploaded CSV file in a single read.
+
+    The header row alone decides whether the file is the nodes or the edges CSV
+    and whether it has the required columns. Files that are neither stop there.
+    Otherwise the body is streamed once to count rows, find non-numeric values
+    in numeric columns and duplicate IDs, and collect the columns for the
+    binary snapshot.
+
+    Args:
+        path (str): Path of the uploaded CSV file.
+
+    Returns:
+        IngestReport: What was found in the file.
+    """
+    with open(path, mode='r', newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        fieldnames = next(reader, [])
+        report = IngestReport(path, classify_header(fieldnames), fieldnames)
+        if report.kind is None:
+            return report
+
+        required = NODES_REQUIRED_COLUMNS if report.kind == 'nodes' else EDGES_REQUIRED_COLUMNS
+        report.missing_columns = [column for column in required if column not in fieldnames]
+
+        numeric = [(fieldnames.index(column), column) for column in NUMERIC_COLUMNS[report.kind]]
+        seen_ids = set()
+        for row in reader:
+            if not row:
+                continue
+            report.row_count += 1
+            for index, column in enumerate(report.columns):
+                column.append(row[index] if index < len(row) else '')
+
+            for index, column in numeric:
+                value = row[index].strip() if index < len(row) else ''
+                if value and not is_number(value):
+                    report.bad_value_count += 1
+                    if len(report.bad_values) < MAX_REPORTED_PROBLEMS:
+                        report.bad_values.append((report.row_count, column, value))
+
+            row_id = row[0] if row else ''
+            if row_id in seen_ids:
+                report.duplicate_id_count += 1
+                if len(report.duplicate_ids) < MAX_REPORTED_PROBLEMS:
+                    report.duplicate_ids.append(row_id)
+            else:
+                seen_ids.add(row_id)
+    return report
@@ -0,0 +1,105 @@
+import re
+from collections import namedtuple
+
+from tag_info import parse_tag
+
+
+# An item tag in a prompt: letters, digits, underscores and dashes, with at least one digit
+TAG = r"(?=[\w-]*\d)[A-Za-z0-9][\w-]*"
+
+# Optional words between a verb and an item tag, e.g. "the element with item tag"
+ELEMENT = r"(?:the\s+)?(?:(?:element|node|item)\s+)?(?:(?:with\s+)?(?:the\s+)?item\s*tag\s+)?"
+
+Intent = namedtuple('Intent', ['operation', 'confirmation'])
+
+
+def normalize_prompt_text(prompt):
+    """A prompt with collapsed whitespace, without a leading 'please' or trailing punctuation."""
+    text = ' '.join(str(prompt).split()).rstrip('.!?')
+    return re.sub(r"^please\s+", '', text, flags=re.IGNORECASE)
+
+
+def is_equipment(store, item_tag):
+    """True for vessels and other equipment, which new elements are attached to through a nozzle."""
+    row = store.node_by_tag(item_tag)
+    node_type = (row.get('Type') or '').lower() if row else ''
+    return parse_tag(item_tag).element_type == 'Equipment' or 'vessel' in node_type or 'equipment' in node_type
+
+
+def add_intent(store, match):
+    new_item_tag, existing_item_tag = match.group('new'), match.group('existing')
+    if store.node_id_by_tag(new_item_tag) is not None or store.node_id_by_tag(existing_item_tag) is None:
+        return None
+    if is_equipment(store, existing_item_tag):
+        return None  # The model adds a nozzle first; leave that to it
+    return Intent(f"Operation: adding, NewItemTag: {new_item_tag}, ExistingItemTag: {existing_item_tag}",
+                  f"You want to add {new_item_tag} to {existing_item_tag}. Is that correct?")
+
+
+def delete_intent(store, match):
+    item_tag = match.group('tag')
+    if store.node_id_by_tag(item_tag) is None:
+        return None
+    return Intent(f"Operation: deleting, RemoveItemTag: {item_tag}",
+                  f"You want to delete {item_tag}. Is that correct?")
+
+
+def swap_intent(store, match):
+    item_tag_1, item_tag_2 = match.group('first'), match.group('second')
+    node_id_1, node_id_2 = store.node_id_by_tag(item_tag_1), store.node_id_by_tag(item_tag_2)
+    if node_id_1 is None or node_id_2 is None or node_id_1 == node_id_2:
+        return None
+    return Intent(f"Relocate_elements: {item_tag_1}, {item_tag_2}",
+                  f"You want to swap the positions of {item_tag_1} and {item_tag_2}. Is that correct?")
+
+
+def size_intent(store, match):
+    item_tag, size = match.group('tag'), int(match.group('size'))
+    if store.node_id_by_tag(item_tag) is None:
+        return None
+    return Intent(repr({'item_type_updates_dict': {item_tag: size}}),
+                  f"You want to change the size of {item_tag} to {size}. Is that correct?")
+
+
+def list_intent(store, match):
+    return Intent("<Request for ItemTags>", "You want to list the item tags of the diagram. Is that correct?")
+
+
+# Prompt forms recognized without the model, and the function that checks the match against the workspace
+INTENTS = [
+    (rf"(?:add|insert|attach|connect)\s+(?:an?\s+)?(?:new\s+)?{ELEMENT}(?P<new>{TAG})\s+(?:to|onto|on)\s+{ELEMENT}(?P<existing>{TAG})",
+     add_intent),
+    (rf"(?:delete|remove)\s+{ELEMENT}(?P<tag>{TAG})", delete_intent),
+    (rf"(?:swap|exchange|switch)\s+(?:the\s+)?(?:positions?\s+of\s+)?{ELEMENT}(?P<first>{TAG})\s+(?:and|with)\s+{ELEMENT}(?P<second>{TAG})",
+     swap_intent),
+    (rf"(?:change|set|update|make)\s+(?:the\s+)?(?:size|nominal\s+diameter)\s+of\s+{ELEMENT}(?P<tag>{TAG})\s+to\s+(?P<size>\d+)",
+     size_intent),
+    (r"(?:list|show|give|get)\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?(?:item\s*tags|tags|nodes)(?:\s+present)?",
+     list_intent),
+]
+INTENTS = [(re.compile(pattern, re.IGNORECASE), build) for pattern, build in INTENTS]
+
+
+def parse_intent(store, prompt):
+    """
+    Recognize a simple prompt without asking the model.
+
+    Handles single "add X to Y", "delete X", "swap X and Y", "change size of
+    X to N" and "list item tags" prompts whose item tags resolve in the
+    workspace as expected (Y and X exist, a new X does not).
+
+    Args:
+        store (GraphStore): The workspace the prompt is about.
+        prompt (str): The user's prompt.
+
+    Returns:
+        Intent: The operation, in the model's reply format that
+                apply_model_response runs, and a confirmation for the user;
+                or None when the prompt should go to the model.
+    """
+    text = normalize_prompt_text(prompt)
+    for pattern, build in INTENTS:
+        match = pattern.fullmatch(text)
+        if match:
+            return build(store, match)
+    return None
@@ -0,0 +1,248 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+import google.generativeai as genai
+import httpx
+import openai
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a model response, and for a connection to be set up
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 10))
+
+# Connections kept open per OpenAI/Azure client, and for how many idle seconds
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 10))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 60))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
+AZURE_OAI_API_VERSION = os.getenv('AZURE_OAI_API_VERSION', '2024-08-01-preview')
+
+# Seconds Gemini keeps the system instructions in its context cache; 0 (the default) sends them with every
+# request. Gemini only caches versioned models (e.g. GEMINI_MODEL=gemini-1.5-flash-002) and instructions
+# above its minimum cache size, which the app's own prompts are below, so only set it for longer ones.
+GEMINI_CACHE_TTL = int(os.getenv('GEMINI_CACHE_TTL', 0))
+
+# Whether Azure streams report token usage (needs an API version that accepts stream_options)
+AZURE_OAI_STREAM_USAGE = os.getenv('AZURE_OAI_STREAM_USAGE', '0') == '1'
+
+
+def pooled_http_client():
+    """An httpx client that keeps up to LLM_POOL_SIZE connections alive between requests."""
+    return httpx.Client(
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=LLM_POOL_SIZE,
+                            max_keepalive_connections=LLM_POOL_SIZE,
+                            keepalive_expiry=LLM_KEEPALIVE_EXPIRY),
+    )
+
+
+def log_usage(model, started, input_tokens=None, output_tokens=None, cached_tokens=None):
+    """Log the token counts and duration of one model request; None where the provider did not say."""
+    logger.info("Token usage: %s", {
+        'model': model,
+        'input_tokens': input_tokens,
+        'cached_input_tokens': cached_tokens,
+        'output_tokens': output_tokens,
+        'seconds': round(time.monotonic() - started, 3),
+    })
+
+
+class GeminiClient:
+    """
+    Gemini configured once per process.
+
+    The system instructions are sent as the model's system_instruction, not
+    as part of the user turn. With GEMINI_CACHE_TTL set they are put in
+    Gemini's context cache when it accepts them, so they are not processed
+    again on every request. The SDK keeps a single gRPC channel open, which
+    multiplexes concurrent requests, so there is no pool size to set.
+    """
+
+    def __init__(self):
+        genai.configure(api_key=os.getenv("API_KEY"))
+        self.models = {}  # system text -> (GenerativeModel, time.monotonic() to renew it at, or None)
+        self.lock = threading.Lock()
+
+    def model_for(self, system_text):
+        """The model with the given system instructions, created on first use."""
+        with self.lock:
+            model, renew_at = self.models.get(system_text, (None, None))
+            if model is None or (renew_at is not None and time.monotonic() >= renew_at):
+                model, renew_at = self.models[system_text] = self.create_model(system_text)
+            return model
+
+    def create_model(self, system_text):
+        if GEMINI_CACHE_TTL > 0:
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=GEMINI_MODEL,
+                    system_instruction=system_text,
+                    ttl=datetime.timedelta(seconds=GEMINI_CACHE_TTL),
+                )
+                # Renew the cache a little before Gemini drops it
+                return genai.GenerativeModel.from_cached_content(cached), time.monotonic() + GEMINI_CACHE_TTL * 0.9
+            except Exception as e:
+                # E.g. an unversioned model or instructions below the minimum cache size; don't ask again
+                print(f"Gemini context cache not used: {e}")
+        return genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_text), None
+
+    def generate(self, system_text, user_text, temperature, max_tokens, stream=False):
+        config = {}
+        if temperature is not None:
+            config['temperature'] = temperature
+        if max_tokens is not None:
+            config['max_output_tokens'] = max_tokens
+        return self.model_for(system_text).generate_content(user_text,
+                                                            generation_config=config or None,
+                                                            stream=stream,
+                                                            request_options={'timeout': LLM_TIMEOUT})
+
+    def log_usage(self, started, usage):
+        log_usage(GEMINI_MODEL, started,
+                  input_tokens=getattr(usage, 'prompt_token_count', None),
+                  output_tokens=getattr(usage, 'candidates_token_count', None),
+                  cached_tokens=getattr(usage, 'cached_content_token_count', None))
+
+    def complete(self, system_text, user_text, temperature=None, max_tokens=None):
+        """Text of the model's answer to user_text under the system_text instructions."""
+        started = time.monotonic()
+        response = self.generate(system_text, user_text, temperature, max_tokens)
+        self.log_usage(started, response.usage_metadata)
+        return response.text.strip()
+
+    def stream(self, system_text, user_text, temperature=None, max_tokens=None):
+        """Yield the model's answer in pieces as they are generated."""
+        started = time.monotonic()
+        usage = None
+        for chunk in self.generate(system_text, user_text, temperature, max_tokens, stream=True):
+            usage = chunk.usage_metadata  # the last chunk has the totals
+            if chunk.parts and chunk.text:
+                yield chunk.text
+        self.log_usage(started, usage)
+
+
+class ChatClient:
+    """
+    OpenAI or Azure OpenAI chat completions over a pooled keep-alive HTTP client.
+
+    The system instructions always come first and unchanged, so the
+    provider's automatic prompt caching can reuse them across requests.
+    """
+
+    def __init__(self, client, model, stream_usage=True):
+        self.client = client
+        self.model = model
+        self.stream_usage = stream_usage  # ask streams to end with a usage chunk
+
+    def generate(self, system_text, user_text, temperature, max_tokens, stream=False):
+        options = {}
+        if temperature is not None:
+            options['temperature'] = temperature
+        if max_tokens is not None:
+            options['max_tokens'] = max_tokens
+        if stream and self.stream_usage:
+            options['stream_options'] = {'include_usage': True}
+        return self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_text},
+                {"role": "user", "content": user_text},
+            ],
+            stream=stream,
+            **options,
+        )
+
+    def log_usage(self, started, usage):
+        details = getattr(usage, 'prompt_tokens_details', None)
+        log_usage(self.model, started,
+                  input_tokens=getattr(usage, 'prompt_tokens', None),
+                  output_tokens=getattr(usage, 'completion_tokens', None),
+                  cached_tokens=getattr(details, 'cached_tokens', None))
+
+    def complete(self, system_text, user_text, temperature=None, max_tokens=None):
+        """Text of the model's answer to user_text under the system_text instructions."""
+        started = time.monotonic()
+        response = self.generate(system_text, user_text, temperature, max_tokens)
+        self.log_usage(started, response.usage)
+        return response.choices[0].message.content.strip()
+
+    def stream(self, system_text, user_text, temperature=None, max_tokens=None):
+        """Yield the model's answer in pieces as they are generated."""
+        started = time.monotonic()
+        usage = None
+        for chunk in self.generate(system_text, user_text, temperature, max_tokens, stream=True):
+            usage = chunk.usage or usage
+            # Azure sends a first chunk without choices, with the content filter results
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        self.log_usage(started, usage)
+
+
+def create_client(provider):
+    """Build the client of a provider ('gemini', 'azure_openai' or 'openai') from the environment."""
+    if provider == "gemini":
+        return GeminiClient()
+    elif provider == "azure_openai":
+        client = openai.AzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OAI_KEY"),
+            api_version=AZURE_OAI_API_VERSION,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=pooled_http_client(),
+        )
+        return ChatClient(client, os.getenv("AZURE_OAI_DEPLOYMENT"), stream_usage=AZURE_OAI_STREAM_USAGE)
+    elif provider == "openai":
+        client = openai.OpenAI(
+            api_key=os.getenv("api"),
+            max_retries=LLM_MAX_RETRIES,
+            http_client=pooled_http_client(),
+        )
+        return ChatClient(client, OPENAI_MODEL)
+    raise ValueError(f"Unknown API key type: {provider}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider):
+    """
+    Return the client of a provider, creating it on first use.
+
+    Clients are shared by all requests of the process: they are thread-safe
+    and reuse their connections instead of repeating the TLS handshake.
+    """
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = _clients[provider] = create_client(provider)
+    return client
+
+
+def complete(provider, system_text, user_text, temperature=None, max_tokens=None):
+    """
+    Ask a provider's model for one answer.
+
+    Args:
+        provider (str): 'gemini', 'azure_openai' or 'openai'.
+        system_text (str): The instructions (system prompt).
+        user_text (str): The user's prompt.
+        temperature (float, optional): Sampling temperature; the provider default if None.
+        max_tokens (int, optional): Longest answer in tokens; the provider default if None.
+
+    Returns:
+        str: The model's answer, stripped.
+    """
+    return get_client(provider).complete(system_text, user_text, temperature=temperature, max_tokens=max_tokens)
+
+
+def stream(provider, system_text, user_text, temperature=None, max_tokens=None):
+    """Like complete(), but yield the answer in pieces as the model generates them."""
+    return get_client(provider).stream(system_text, user_text, temperature=temperature, max_tokens=max_tokens)
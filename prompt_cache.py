@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+
+from cachetools import TTLCache
+
+from graph_store import normalize_tag
+
+
+# How many model replies are kept, and for how many seconds
+PROMPT_CACHE_SIZE = int(os.getenv('PROMPT_CACHE_SIZE', 256))
+PROMPT_CACHE_TTL = float(os.getenv('PROMPT_CACHE_TTL', 900))
+
+# How many confirmed-but-not-yet-applied operations are kept, and for how many seconds
+CONFIRMATION_LIMIT = int(os.getenv('CONFIRMATION_LIMIT', 1024))
+CONFIRMATION_TTL = float(os.getenv('CONFIRMATION_TTL', 1800))
+
+# Words that can be item tags: they contain a digit, e.g. VES-5003, PI-101A or 12
+TAG_WORD = re.compile(r"[A-Za-z0-9][\w-]*\d[\w-]*|\d+")
+
+
+def normalize_prompt(prompt):
+    """A prompt with its whitespace collapsed; case is kept since new item tags are taken from it."""
+    return ' '.join(str(prompt).split())
+
+
+def referenced_tags(text):
+    """Normalized item tags a prompt or model reply may refer to, sorted."""
+    return sorted({normalize_tag(word) for word in TAG_WORD.findall(str(text))})
+
+
+def tag_version(store, item_tags):
+    """
+    Hash of which of the given item tags exist in a workspace, and as which node.
+
+    Adding, removing or re-creating a node with one of the tags changes the
+    hash; changing other columns of its row (size, type, position) does not.
+    """
+    digest = hashlib.sha1()
+    for item_tag in item_tags:
+        digest.update(f"{item_tag}={store.node_id_by_tag(item_tag)}\0".encode())
+    return digest.hexdigest()
+
+
+class PromptCache:
+    """
+    LRU cache with expiry of model replies to prompts.
+
+    The key is the normalized prompt, the provider and the tag_version of the
+    item tags in the prompt. An entry also remembers the tag_version of the
+    tags in the reply from before the reply ran, and is dropped when any of
+    them differs from that.
+    """
+
+    def __init__(self, maxsize=PROMPT_CACHE_SIZE, ttl=PROMPT_CACHE_TTL):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, store, prompt, provider):
+        """Cache key of a prompt sent to a provider, in the workspace's current state."""
+        return normalize_prompt(prompt), provider, tag_version(store, referenced_tags(prompt))
+
+    def get(self, store, key):
+        """The cached reply for the key, or None; counts a hit or a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                reply, reply_tags, version = entry
+                if tag_version(store, reply_tags) == version:
+                    self.hits += 1
+                    return reply
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def snapshot(self, store, reply):
+        """The item tags a reply refers to and their tag_version; taken before the reply runs."""
+        reply_tags = referenced_tags(reply)
+        return reply_tags, tag_version(store, reply_tags)
+
+    def put(self, key, reply, snapshot):
+        """Remember the model's reply for the key, with the snapshot taken before it ran."""
+        reply_tags, version = snapshot
+        with self.lock:
+            self.entries[key] = (reply, reply_tags, version)
+
+    def discard(self, key):
+        """Forget the reply for the key, e.g. because running it failed."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        """Hit and miss counts and the number of cached replies."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+class ConfirmedOperations:
+    """
+    Operations the model planned while confirming a prompt, kept until the user confirms.
+
+    Each one is stored under a random token that is handed to the browser;
+    taking it back requires the same prompt and provider, and works once.
+    """
+
+    def __init__(self, maxsize=CONFIRMATION_LIMIT, ttl=CONFIRMATION_TTL):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def remember(self, prompt, provider, operation):
+        """Store an operation and return its token."""
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.entries[token] = (normalize_prompt(prompt), provider, operation)
+        return token
+
+    def take(self, token, prompt, provider):
+        """The operation stored under the token for this prompt and provider, or None."""
+        if not token:
+            return None
+        with self.lock:
+            entry = self.entries.pop(token, None)
+        if entry is None or entry[:2] != (normalize_prompt(prompt), provider):
+            return None
+        return entry[2]
+
+
+prompt_cache = PromptCache()
+confirmed_operations = ConfirmedOperations()
@@ -0,0 +1,155 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+
+SNAPSHOT_SUFFIX = '.npz'
+
+# Separator of the values of a snapshot column; CSV cells practically never contain it
+VALUE_SEPARATOR = '\0'
+
+
+def snapshot_path(csv_path):
+    """Path of the binary snapshot kept next to a CSV file, e.g. csvs_nodes.csv.npz."""
+    return f"{csv_path}{SNAPSHOT_SUFFIX}"
+
+
+def csv_signature(csv_path):
+    """(mtime_ns, size) of the CSV file, used to tell whether a snapshot is still fresh."""
+    stat = os.stat(csv_path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def write_snapshot(csv_path, fieldnames, columns):
+    """
+    Store the columns of a CSV file as a compressed NumPy .npz archive.
+
+    Every column is kept as its values joined by VALUE_SEPARATOR into one
+    UTF-8 byte array, so values come back exactly as they are written in the
+    CSV, no pickling is involved and short values are not padded to the width
+    of the longest one. A column with a value containing the separator also
+    stores the end of each value, in characters. The archive records the
+    CSV's mtime and size; it is only used while those still match.
+
+    Args:
+        csv_path (str): Path of the CSV file the columns belong to.
+        fieldnames (list): Header of the CSV file.
+        columns (list): One sequence of cell values per header column.
+    """
+    arrays = {
+        'signature': csv_signature(csv_path),
+        'fields': np.array(fieldnames, dtype=str),
+        'rows': np.array(len(columns[0]) if columns else 0, dtype=np.int64),
+    }
+    for index, values in enumerate(columns):
+        values = ['' if value is None else str(value) for value in values]
+        text = VALUE_SEPARATOR.join(values)
+        if text.count(VALUE_SEPARATOR) != max(len(values) - 1, 0):
+            text = ''.join(values)
+            arrays[f'ends_{index}'] = np.cumsum([len(value) for value in values], dtype=np.int64)
+        arrays[f'column_{index}'] = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+
+    temp_path = f"{snapshot_path(csv_path)}.tmp"
+    with open(temp_path, mode='wb') as snapshot_file:
+        np.savez_compressed(snapshot_file, **arrays)
+    os.replace(temp_path, snapshot_path(csv_path))
+
+
+def write_snapshot_rows(csv_path, fieldnames, rows):
+    """Snapshot a CSV file from row dictionaries that were just written to it."""
+    rows = list(rows)
+    columns = [[row.get(field, '') for row in rows] for field in fieldnames]
+    write_snapshot(csv_path, fieldnames, columns)
+
+
+def decode_column(snapshot, index, rows):
+    """The values of one snapshot column."""
+    text = snapshot[f'column_{index}'].tobytes().decode('utf-8')
+    if f'ends_{index}' in snapshot.files:
+        ends = snapshot[f'ends_{index}'].tolist()
+        return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+    return text.split(VALUE_SEPARATOR) if rows else []
+
+
+def load_snapshot(csv_path, decode=True):
+    """
+    Return (fieldnames, columns) from a fresh snapshot, or None if there is none.
+
+    With decode=False the columns are not read and only their number of rows
+    is returned, in place of the columns.
+    """
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as snapshot:
+            if not np.array_equal(snapshot['signature'], csv_signature(csv_path)):
+                return None
+            fieldnames = snapshot['fields'].tolist()
+            rows = int(snapshot['rows'])
+            if not decode:
+                return fieldnames, rows
+            columns = [decode_column(snapshot, index, rows) for index in range(len(fieldnames))]
+    except (OSError, KeyError, ValueError):
+        return None  # Unreadable, partial or older format snapshot; fall back to the CSV
+    return fieldnames, columns
+
+
+def build_snapshot(csv_path):
+    """Parse the CSV file once, write its snapshot and return (fieldnames, columns)."""
+    with open(csv_path, mode='r', newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        fieldnames = next(reader, [])
+        columns = [[] for _ in fieldnames]
+        for row in reader:
+            if not row:
+                continue
+            for index, column in enumerate(columns):
+                column.append(row[index] if index < len(row) else '')
+    write_snapshot(csv_path, fieldnames, columns)
+    return fieldnames, columns
+
+
+def read_columns(csv_path):
+    """
+    Return (fieldnames, columns) of a CSV file, each column a list of strings.
+
+    The snapshot is used when it is fresh; otherwise the CSV is parsed and the
+    snapshot regenerated.
+    """
+    return load_snapshot(csv_path) or build_snapshot(csv_path)
+
+
+def read_rows(csv_path):
+    """
+    Return (fieldnames, rows) of a CSV file, with rows as dictionaries of strings.
+
+    The rows are an iterator that builds each dictionary as it is reached.
+    """
+    fieldnames, columns = read_columns(csv_path)
+    rows = (dict(zip(fieldnames, row)) for row in zip(*columns))
+    return fieldnames, rows
+
+
+def read_frame(csv_path):
+    """
+    Return a CSV file as a pandas DataFrame of strings.
+
+    Empty cells become NaN, as they would with pd.read_csv. Numeric columns
+    are left as strings; convert them with pd.to_numeric where needed.
+    """
+    fieldnames, columns = read_columns(csv_path)
+    frame = pd.DataFrame({index: column for index, column in enumerate(columns)})
+    frame.columns = fieldnames
+    return frame.replace('', np.nan)
+
+
+def row_count(csv_path):
+    """Number of data rows in a CSV file."""
+    snapshot = load_snapshot(csv_path, decode=False)
+    if snapshot is not None:
+        return snapshot[1]
+    fieldnames, columns = build_snapshot(csv_path)
+    return len(columns[0]) if columns else 0
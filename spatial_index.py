@@ -0,0 +1,89 @@
+import math
+from collections import deque
+
+
+class SpatialGrid:
+    """
+    Uniform grid over 2D points for fast "is anything close to (x, y)?" queries.
+
+    Points are bucketed into square cells of cell_size. A query only looks at
+    the cells overlapping the search circle, so its cost depends on how crowded
+    that area is and not on the total number of points. Points can be inserted,
+    moved and removed one at a time.
+    """
+
+    def __init__(self, cell_size=0.05):
+        self.cell_size = cell_size
+        self.cells = {}   # (column, row) -> {key: (x, y)}
+        self.points = {}  # key -> (x, y)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def cell_of(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, key, x, y):
+        """Add a point, or move it if the key is already in the grid."""
+        if key in self.points:
+            self.remove(key)
+        self.points[key] = (x, y)
+        self.cells.setdefault(self.cell_of(x, y), {})[key] = (x, y)
+
+    def remove(self, key):
+        """Remove a point; unknown keys are ignored."""
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        cell = self.cell_of(*point)
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.points.clear()
+
+    def points_in_box(self, min_x, min_y, max_x, max_y):
+        """Return the (x, y) of every point in the cells overlapping the given box."""
+        min_column, min_row = self.cell_of(min_x, min_y)
+        max_column, max_row = self.cell_of(max_x, max_y)
+        found = []
+        # Walk whichever is smaller: the cells of the box or the occupied cells
+        if (max_column - min_column + 1) * (max_row - min_row + 1) <= len(self.cells):
+            for column in range(min_column, max_column + 1):
+                for row in range(min_row, max_row + 1):
+                    bucket = self.cells.get((column, row))
+                    if bucket:
+                        found.extend(bucket.values())
+        else:
+            for (column, row), bucket in self.cells.items():
+                if min_column <= column <= max_column and min_row <= row <= max_row:
+                    found.extend(bucket.values())
+        return found
+
+
+class BoundedGrid(SpatialGrid):
+    """SpatialGrid of anonymous points that only keeps the limit most recently added ones."""
+
+    def __init__(self, limit, cell_size=0.05):
+        super().__init__(cell_size)
+        self.limit = limit
+        self.order = deque()  # keys, oldest first
+        self.next_key = 0
+
+    def add(self, x, y):
+        key = self.next_key
+        self.next_key += 1
+        self.insert(key, x, y)
+        self.order.append(key)
+        while len(self.order) > self.limit:
+            self.remove(self.order.popleft())
+
+    def clear(self):
+        super().clear()
+        self.order.clear()
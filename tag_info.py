@@ -0,0 +1,148 @@
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# How many distinct ItemTags parse_tag remembers
+TAG_CACHE_SIZE = int(os.getenv('TAG_CACHE_SIZE', 4096))
+
+# Node CSV column filled from each TagInfo field
+TAG_COLUMNS = {
+    'element_type': 'Type',
+    'tag_prefix': 'TagPrefix',
+    'tag_sequence_no': 'TagSequenceNo',
+    'tag_suffix': 'TagSuffix',
+    'measured_variable_code': 'MeasuredVariableCode',
+    'instrument_type_modifier': 'InstrumentTypeModifier',
+}
+
+
+class TagInfo(namedtuple('TagInfo', list(TAG_COLUMNS))):
+    """Everything the node CSV derives from an ItemTag."""
+
+    __slots__ = ()
+
+    def as_row(self):
+        """The fields keyed by node CSV column name."""
+        return {TAG_COLUMNS[field]: value for field, value in zip(self._fields, self)}
+
+
+def element_type_of(upper_tag):
+    """Type of element for an upper-cased item tag; the first matching rule wins."""
+    if 'VES' in upper_tag or 'MP' in upper_tag:
+        return 'Equipment'
+    elif upper_tag.startswith('N'):
+        return 'Nozzle'
+    elif 'PI' in upper_tag or 'PG' in upper_tag:
+        return 'Pressure Guage'
+    elif 'COO' in upper_tag or 'COOLER' in upper_tag:
+        return 'Cooler'
+    elif upper_tag.startswith('P') or 'PUMP' in upper_tag:
+        return 'Pump'
+    elif upper_tag.startswith('V'):
+        return 'Valve'
+    elif upper_tag.startswith('H'):
+        return 'Heat Exchanger'
+    elif upper_tag.startswith('F'):
+        return 'Filter'
+    elif upper_tag.startswith('S'):
+        return 'Sensor'
+    elif upper_tag.isdigit():
+        return 'Piping Component'
+    elif upper_tag.startswith('J'):
+        return 'Junction'
+    else:
+        return 'Instrument'
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def parse_tag(item_tag):
+    """
+    Derive all tag fields of an item tag in one pass.
+
+    Results are memoized, so the same tag showing up again (e.g. when a prompt
+    is retried or a node is re-read) costs a dictionary lookup.
+
+    Args:
+        item_tag (str): The item tag, e.g. 'PI-101A'.
+
+    Returns:
+        TagInfo: Element type, tag prefix, sequence number, suffix, measured
+                 variable code and instrument type modifier.
+    """
+    prefix_match = re.match(r"^[A-Za-z]+", item_tag)
+    if prefix_match:
+        tag_prefix = prefix_match.group(0)
+    elif item_tag.isdigit():
+        tag_prefix = 'PC'  # Piping Component
+    else:
+        tag_prefix = ""
+
+    digits = re.findall(r"\d+", item_tag)
+    tag_sequence_no = digits[-1] if digits else ""  # Use the last found digit sequence
+
+    # The suffix is the last character if it's a letter
+    tag_suffix = item_tag[-1] if re.search(r"[A-Za-z]$", item_tag) else " "
+
+    return TagInfo(
+        element_type=element_type_of(item_tag.upper()),
+        tag_prefix=tag_prefix,
+        tag_sequence_no=tag_sequence_no,
+        tag_suffix=tag_suffix,
+        measured_variable_code=tag_prefix[:1],
+        instrument_type_modifier=tag_prefix[1:],
+    )
+
+
+def parse_tags(item_tags):
+    """
+    Vectorized parse_tag over a whole column of item tags.
+
+    Args:
+        item_tags: A pandas Series (or any sequence) of item tags; missing
+                   values are treated as empty tags.
+
+    Returns:
+        pandas.DataFrame: One row per tag, with the node CSV columns Type,
+        TagPrefix, TagSequenceNo, TagSuffix, MeasuredVariableCode and
+        InstrumentTypeModifier, indexed like item_tags.
+    """
+    tags = pd.Series(item_tags, dtype=object).fillna('').astype(str)
+    upper = tags.str.upper()
+    is_digit = tags.str.isdigit()
+
+    tag_prefix = tags.str.extract(r"^([A-Za-z]+)", expand=False).fillna('')
+    tag_prefix = tag_prefix.mask(is_digit, 'PC')
+    tag_sequence_no = tags.str.extract(r"(\d+)\D*$", expand=False).fillna('')
+    tag_suffix = tags.str.extract(r"([A-Za-z])$", expand=False).fillna(' ')
+
+    # Same rules, in the same order, as element_type_of
+    conditions = [
+        upper.str.contains('VES', regex=False) | upper.str.contains('MP', regex=False),
+        upper.str.startswith('N'),
+        upper.str.contains('PI', regex=False) | upper.str.contains('PG', regex=False),
+        upper.str.contains('COO', regex=False),
+        upper.str.startswith('P') | upper.str.contains('PUMP', regex=False),
+        upper.str.startswith('V'),
+        upper.str.startswith('H'),
+        upper.str.startswith('F'),
+        upper.str.startswith('S'),
+        is_digit,
+        upper.str.startswith('J'),
+    ]
+    choices = ['Equipment', 'Nozzle', 'Pressure Guage', 'Cooler', 'Pump', 'Valve',
+               'Heat Exchanger', 'Filter', 'Sensor', 'Piping Component', 'Junction']
+    element_type = np.select([condition.to_numpy(dtype=bool) for condition in conditions], choices, default='Instrument')
+
+    return pd.DataFrame({
+        'Type': pd.Series(element_type, index=tags.index, dtype=object),
+        'TagPrefix': tag_prefix,
+        'TagSequenceNo': tag_sequence_no,
+        'TagSuffix': tag_suffix,
+        'MeasuredVariableCode': tag_prefix.str[:1],
+        'InstrumentTypeModifier': tag_prefix.str[1:],
+    }, index=tags.index)
@@ -0,0 +1,99 @@
+import os
+
+from graph_store import JOURNAL_FILENAME, GraphStore
+from test_updated import make_chain
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_flushed_changes_are_journaled_and_replayed_on_load(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    csv_before = read(nodes_csv)
+    store = GraphStore(nodes_csv, edges_csv)
+
+    with store.operation():
+        store.update_node('n0', {'Subtype': 'Ball Valve'})
+        store.remove_edge('e1')
+
+    assert read(nodes_csv) == csv_before
+    assert os.path.getsize(tmp_path / JOURNAL_FILENAME) > 0
+    reloaded = GraphStore(nodes_csv, edges_csv)
+    assert reloaded.get_node('n0')['Subtype'] == 'Ball Valve'
+    assert list(reloaded.edges) == ['e0']
+
+
+def test_incomplete_last_journal_line_is_ignored(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2'])
+    store = GraphStore(nodes_csv, edges_csv)
+    with store.operation():
+        store.update_node('n0', {'Subtype': 'Ball Valve'})
+    with open(tmp_path / JOURNAL_FILENAME, 'a') as journal:
+        journal.write('{"op": "remove_node", "ke')
+
+    reloaded = GraphStore(nodes_csv, edges_csv)
+
+    assert reloaded.get_node('n0')['Subtype'] == 'Ball Valve'
+    assert reloaded.get_node('n1') is not None
+
+
+def test_compaction_writes_the_csv_files_and_empties_the_journal(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    store = GraphStore(nodes_csv, edges_csv)
+    with store.operation():
+        store.remove_node('n2')
+        store.remove_edge('e1')
+
+    store.compact()
+
+    assert os.path.getsize(tmp_path / JOURNAL_FILENAME) == 0
+    assert b'V-3' not in read(nodes_csv)
+    assert b'e1' not in read(edges_csv)
+    reloaded = GraphStore(nodes_csv, edges_csv)
+    assert list(reloaded.nodes) == ['n0', 'n1']
+    assert list(reloaded.edges) == ['e0']
+
+
+def test_stores_of_two_processes_see_each_others_changes(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    first, second = GraphStore(nodes_csv, edges_csv), GraphStore(nodes_csv, edges_csv)
+
+    with first.operation():
+        first.update_node('n0', {'Subtype': 'Ball Valve'})
+    with second.operation():
+        second.update_node('n1', {'Subtype': 'Gate Valve'})
+    second.compact()
+    first.refresh()
+
+    for store in (first, second, GraphStore(nodes_csv, edges_csv)):
+        assert [store.get_node(node_id)['Subtype'] for node_id in ('n0', 'n1')] == ['Ball Valve', 'Gate Valve']
+
+
+def test_updates_of_the_same_length_are_patched_into_the_csv_file(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    csv_before, inode_before = read(nodes_csv), os.stat(nodes_csv).st_ino
+    store = GraphStore(nodes_csv, edges_csv)
+    with store.operation():
+        store.update_node('n1', {'Type': 'Pumps'})
+
+    store.compact()
+
+    assert os.stat(nodes_csv).st_ino == inode_before
+    assert read(nodes_csv) == csv_before.replace(b'n1,Valve,', b'n1,Pumps,')
+    assert GraphStore(nodes_csv, edges_csv).get_node('n1')['Type'] == 'Pumps'
+
+
+def test_updates_that_change_the_row_length_rewrite_the_csv_file(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    inode_before = os.stat(nodes_csv).st_ino
+    store = GraphStore(nodes_csv, edges_csv)
+    with store.operation():
+        store.update_node('n1', {'Type': 'Instrument'})
+
+    store.compact()
+
+    assert os.stat(nodes_csv).st_ino != inode_before
+    reloaded = GraphStore(nodes_csv, edges_csv)
+    assert [reloaded.get_node(node_id)['Type'] for node_id in ('n0', 'n1', 'n2')] == ['Valve', 'Instrument', 'Valve']
@@ -0,0 +1,46 @@
+from graph_store import GraphStore
+from intent_parser import parse_intent
+from test_updated import make_chain
+
+
+def workspace(tmp_path):
+    return GraphStore(*make_chain(str(tmp_path), ['V-1', 'V-2', 'PI-101']))
+
+
+def operation(store, prompt):
+    intent = parse_intent(store, prompt)
+    return intent.operation if intent else None
+
+
+def test_simple_prompts_give_the_operation_the_model_would(tmp_path):
+    store = workspace(tmp_path)
+
+    assert operation(store, "Please add V-9 to the element with item tag V-1.") == \
+        "Operation: adding, NewItemTag: V-9, ExistingItemTag: V-1"
+    assert operation(store, "delete  v-2") == "Operation: deleting, RemoveItemTag: v-2"
+    assert operation(store, "swap the positions of V-1 and V-2") == "Relocate_elements: V-1, V-2"
+    assert operation(store, "change the size of V-1 to 50") == "{'item_type_updates_dict': {'V-1': 50}}"
+    assert operation(store, "list all the item tags") == "<Request for ItemTags>"
+
+
+def test_confirmation_describes_the_operation(tmp_path):
+    intent = parse_intent(workspace(tmp_path), "delete V-2")
+
+    assert intent.confirmation == "You want to delete V-2. Is that correct?"
+
+
+def test_prompts_whose_tags_do_not_resolve_go_to_the_model(tmp_path):
+    store = workspace(tmp_path)
+
+    assert operation(store, "delete V-7") is None
+    assert operation(store, "add V-2 to V-1") is None  # V-2 already exists
+    assert operation(store, "add V-9 to V-7") is None
+    assert operation(store, "swap V-1 and v-1") is None
+
+
+def test_other_prompts_go_to_the_model(tmp_path):
+    store = workspace(tmp_path)
+
+    assert operation(store, "delete V-1 and V-2") is None
+    assert operation(store, "add a pressure indicator after V-1") is None
+    assert operation(store, "what is connected to V-1?") is None
@@ -0,0 +1,51 @@
+import os
+
+from snapshot import load_snapshot, read_rows, row_count, snapshot_path, write_snapshot
+
+
+def write_csv(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def test_snapshot_round_trips_the_values(tmp_path):
+    csv_path = str(tmp_path / 'csvs_nodes.csv')
+    write_csv(csv_path, 'ID,ItemTag\n')
+    columns = [['n0', 'n1', 'n2', 'n3'], ['', 'VÄ-1', 'a,b\nc', 'with\0nul']]
+
+    write_snapshot(csv_path, ['ID', 'ItemTag'], columns)
+
+    assert load_snapshot(csv_path) == (['ID', 'ItemTag'], columns)
+    assert row_count(csv_path) == 4
+
+
+def test_snapshot_is_built_on_first_read_and_used_while_fresh(tmp_path):
+    csv_path = str(tmp_path / 'csvs_nodes.csv')
+    write_csv(csv_path, 'ID,ItemTag\nn0,V-1\nn1\n')
+
+    fieldnames, rows = read_rows(csv_path)
+
+    assert fieldnames == ['ID', 'ItemTag']
+    assert list(rows) == [{'ID': 'n0', 'ItemTag': 'V-1'}, {'ID': 'n1', 'ItemTag': ''}]
+    assert load_snapshot(csv_path) == (['ID', 'ItemTag'], [['n0', 'n1'], ['V-1', '']])
+
+
+def test_snapshot_of_a_changed_csv_is_not_used(tmp_path):
+    csv_path = str(tmp_path / 'csvs_nodes.csv')
+    write_csv(csv_path, 'ID,ItemTag\nn0,V-1\n')
+    read_rows(csv_path)
+
+    write_csv(csv_path, 'ID,ItemTag\nn0,V-1\nn1,V-2\n')
+
+    assert load_snapshot(csv_path) is None
+    assert [row['ItemTag'] for row in read_rows(csv_path)[1]] == ['V-1', 'V-2']
+    assert row_count(csv_path) == 2
+
+
+def test_unreadable_snapshot_falls_back_to_the_csv(tmp_path):
+    csv_path = str(tmp_path / 'csvs_nodes.csv')
+    write_csv(csv_path, 'ID,ItemTag\nn0,V-1\n')
+    write_csv(snapshot_path(csv_path), 'not an archive')
+
+    assert [row['ItemTag'] for row in read_rows(csv_path)[1]] == ['V-1']
+    assert os.path.getsize(snapshot_path(csv_path)) > len('not an archive')
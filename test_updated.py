@@ -0,0 +1,142 @@
+import csv
+import os
+
+import updated
+from graph_store import get_store
+from updated import (execute_model_response, get_user_data_and_update_csv, remove_node_and_update_edges,
+                     remove_nodes_and_update_edges, update_item_types)
+
+
+NODE_FIELDS = ['ID', 'Type', 'XCoordinate', 'YCoordinate', 'DrawingID', 'Subtype', 'ItemTag', 'TagPrefix',
+               'TagSequenceNo', 'TagSuffix', 'MeasuredVariableCode', 'InstrumentTypeModifier']
+EDGE_FIELDS = ['ID', 'RunID', 'Type', 'StartNode', 'EndNode', 'FlowDir', 'DrawingID', 'ItemTag']
+
+
+def make_chain(folder, item_tags):
+    """Write a workspace whose nodes are connected in a line, in the order of item_tags."""
+    os.makedirs(folder, exist_ok=True)
+    nodes_csv = os.path.join(folder, 'csvs_nodes.csv')
+    edges_csv = os.path.join(folder, 'csvs_edges.csv')
+    with open(nodes_csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(NODE_FIELDS)
+        for index, item_tag in enumerate(item_tags):
+            writer.writerow([f'n{index}', 'Valve', index, 0, 'D1', '', item_tag, 'V', index, '', 'V', ''])
+    with open(edges_csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EDGE_FIELDS)
+        for index in range(len(item_tags) - 1):
+            writer.writerow([f'e{index}', '', 'Piping', f'n{index}', f'n{index + 1}', 'StartNode to EndNode', 'D1', ''])
+    return nodes_csv, edges_csv
+
+
+def connected_pairs(nodes_csv, edges_csv):
+    """The item tags joined by each edge, without direction."""
+    store = get_store(nodes_csv, edges_csv)
+    return sorted(tuple(sorted(store.get_node(edge[end])['ItemTag'] for end in ('StartNode', 'EndNode')))
+                  for edge in store.edges.values())
+
+
+def test_batch_delete_of_adjacent_nodes_reconnects_the_line(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3', 'V-4'])
+
+    result = remove_nodes_and_update_edges(['V-2', 'V-3'], nodes_csv, edges_csv)
+
+    assert result['status'] == 'success'
+    assert connected_pairs(nodes_csv, edges_csv) == [('V-1', 'V-4')]
+
+
+def test_batch_delete_matches_deleting_one_after_the_other(tmp_path):
+    batch = make_chain(str(tmp_path / 'batch'), ['V-1', 'V-2', 'V-3', 'V-4', 'V-5', 'V-6'])
+    sequential = make_chain(str(tmp_path / 'sequential'), ['V-1', 'V-2', 'V-3', 'V-4', 'V-5', 'V-6'])
+
+    remove_nodes_and_update_edges(['V-2', 'V-3', 'V-5'], *batch)
+    for item_tag in ['V-2', 'V-3', 'V-5']:
+        remove_node_and_update_edges(item_tag, *sequential)
+
+    assert connected_pairs(*batch) == connected_pairs(*sequential) == [('V-1', 'V-4'), ('V-4', 'V-6')]
+
+
+def test_deletion_without_item_tags_is_an_error(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2'])
+
+    result = execute_model_response("{'addition_dict': {}, 'deletions_dict': {'Deletion': []}}", nodes_csv, edges_csv)
+
+    assert result == {'status': 'error', 'message': 'No item tags to delete.'}
+    assert remove_nodes_and_update_edges([], nodes_csv, edges_csv)['status'] == 'error'
+    assert connected_pairs(nodes_csv, edges_csv) == [('V-1', 'V-2')]
+
+
+def test_type_change_retypes_the_edges_of_the_node(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+
+    update_item_types(nodes_csv, {'operation': 'type', 'V-1': 'Instrument', 'V-2': 'Instrument'})
+
+    store = get_store(nodes_csv, edges_csv)
+    assert [store.edges[key]['Type'] for key in ('e0', 'e1')] == ['Signal', 'Piping']
+
+
+def test_type_update_keeps_edge_types_when_no_node_type_changes(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    store = get_store(nodes_csv, edges_csv)
+    with store.operation():
+        store.update_edge('e0', {'Type': 'Direct Connection'})
+        store.update_edge('e1', {'Type': 'Signal'})
+
+    update_item_types(nodes_csv, {'operation': 'type', 'V-1': 'Valve', 'V-2': 'Valve'})
+
+    assert [store.edges[key]['Type'] for key in ('e0', 'e1')] == ['Direct Connection', 'Signal']
+
+
+def test_type_change_keeps_edge_types_the_rules_did_not_give(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-3'])
+    store = get_store(nodes_csv, edges_csv)
+    with store.operation():
+        store.update_edge('e0', {'Type': 'Direct Connection'})
+
+    update_item_types(nodes_csv, {'operation': 'type', 'V-1': 'Instrument', 'V-2': 'Instrument'})
+
+    assert [store.edges[key]['Type'] for key in ('e0', 'e1')] == ['Direct Connection', 'Piping']
+
+
+def test_update_changes_every_node_with_the_item_tag(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2', 'V-1'])
+
+    update_item_types(nodes_csv, {'V-1': 20})
+
+    store = get_store(nodes_csv, edges_csv)
+    assert [store.get_node(node_id)['NominalDiameter'] for node_id in ('n0', 'n1', 'n2')] == [20, '', 20]
+
+
+def test_retyping_an_edge_to_a_missing_node_does_not_fail_the_operation(tmp_path):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2'])
+    with open(edges_csv, 'a', newline='') as f:
+        csv.writer(f).writerow(['e1', '', 'Piping', 'n1', 'GHOST', 'StartNode to EndNode', 'D1', ''])
+    store = get_store(nodes_csv, edges_csv)
+
+    with store.transaction():
+        store.update_edge('e1', {'Type': 'Signal'})
+        assert store.pending_problems() == []
+        store.update_edge('e0', {'EndNode': 'GHOST'})
+        assert store.pending_problems() == ["Edge e0 refers to missing node 'GHOST'."]
+
+
+def test_repeated_prompt_reuses_the_reply_until_a_tag_it_refers_to_changes(tmp_path, monkeypatch):
+    nodes_csv, edges_csv = make_chain(str(tmp_path), ['V-1', 'V-2'])
+    calls = []
+    def complete(*args, **kwargs):
+        calls.append(args)
+        return "Operation: adding, NewItemTag: V-9, ExistingItemTag: V-1"
+    monkeypatch.setattr(updated, 'complete', complete)
+    prompt = f"put a new valve after the first valve {tmp_path.name}"  # no item tags; unique per test run
+
+    assert get_user_data_and_update_csv(prompt, nodes_csv, edges_csv, 'openai')['status'] == 'success'
+    remove_node_and_update_edges('V-9', nodes_csv, edges_csv)
+    assert get_user_data_and_update_csv(prompt, nodes_csv, edges_csv, 'openai')['status'] == 'success'
+    assert len(calls) == 1
+    assert get_store(nodes_csv, edges_csv).node_id_by_tag('V-9') is not None
+
+    remove_node_and_update_edges('V-9', nodes_csv, edges_csv)
+    update_item_types(nodes_csv, {'V-1': 'V-7'})
+    get_user_data_and_update_csv(prompt, nodes_csv, edges_csv, 'openai')
+    assert len(calls) == 2
@@ -1,84 +1,53 @@
-import openai
 import csv
 import uuid
 import re
 import os
 import ast
-import google.generativeai as genai
 import pandas as pd
+import numpy as np
 import json
+import logging
 import math
 import random
+import sys
+import threading
 from flask import session
 from flask import jsonify
+from graph_store import TransactionAborted, get_store, normalize_tag
+from tag_info import parse_tag, parse_tags
+from edge_rules import assign_edge_types, determine_edge_type, determine_edge_types
+from llm_clients import complete, stream
+from prompt_cache import confirmed_operations, prompt_cache
+from intent_parser import parse_intent
 
+logger = logging.getLogger(__name__)
 
 
-# Helper functions for determining node attributes
+# Helper functions for determining node attributes; each one reads a field of the memoized parse_tag result
 def determine_element_type(new_item_tag):
     """Determine the type of element based on the item tag."""
-    new_item_tag = new_item_tag.upper()
-    if 'VES' in new_item_tag or 'MP' in new_item_tag:
-        return 'Equipment'
-    elif new_item_tag.startswith('N'):
-        return 'Nozzle'
-    elif 'PI' in new_item_tag or 'PG' in new_item_tag:
-        return 'Pressure Guage'
-    elif 'COO' in new_item_tag or 'COOLER' in new_item_tag:
-        return 'Cooler'
-    elif new_item_tag.startswith('P') or 'PUMP' in new_item_tag:
-        return 'Pump'
-    elif new_item_tag.startswith('V'):
-        return 'Valve'
-    elif new_item_tag.startswith('H'):
-        return 'Heat Exchanger'
-    elif new_item_tag.startswith('F'):
-        return 'Filter'
-    elif new_item_tag.startswith('S'):
-        return 'Sensor'
-    elif new_item_tag.isdigit():
-        return 'Piping Component'
-    elif new_item_tag.startswith('J'):
-        return 'Junction'
-    else:
-        return 'Instrument'
+    return parse_tag(new_item_tag).element_type
 
 
 def determine_tag_prefix(new_item_tag):
     """Determine the tag prefix based on the item tag."""
-    match = re.match(r"^[A-Za-z]+", new_item_tag)
-    if match:
-        return match.group(0)
-    elif new_item_tag.isdigit():
-        return 'PC'  # Piping Component
-    return ""
+    return parse_tag(new_item_tag).tag_prefix
+
 def determine_tag_suffix(new_item_tag):
     """Determine the tag suffix based on the item tag."""
-    # Check if the last character is alphabetical
-    if re.search(r"[A-Za-z]$", new_item_tag):
-        return new_item_tag[-1]  # Return the last character if it's a letter
-    return " "
+    return parse_tag(new_item_tag).tag_suffix
 
 def get_measured_variable_code(new_item_tag):
     """Extract the MeasuredVariableCode (first character of the tag prefix)."""
-    prefix = determine_tag_prefix(new_item_tag)
-    if prefix:
-        return prefix[0]  # First character of the prefix as MeasuredVariableCode
-    return ""  # Return empty if no valid prefix is found
+    return parse_tag(new_item_tag).measured_variable_code
 
 def get_instrument_type_modifier(new_item_tag):
     """Extract the InstrumentTypeModifier (remaining characters of the tag prefix)."""
-    prefix = determine_tag_prefix(new_item_tag)
-    if prefix:
-        return prefix[1:]  # Remaining part of the prefix as InstrumentTypeModifier
-    return ""  # Return empty if no valid prefix is found
+    return parse_tag(new_item_tag).instrument_type_modifier
 
 def determine_tag_sequence_no(new_item_tag):
     """Determine the tag sequence number based on any digit in the item tag."""
-    digits = re.findall(r"\d+", new_item_tag)  # Find all sequences of digits
-    if digits:
-        return digits[-1]  # Use the last found digit sequence
-    return ""
+    return parse_tag(new_item_tag).tag_sequence_no
 
 
 def get_node_types(node_id1, node_id2, nodes_csv='uploaded_files/csvs_nodes.csv'):
@@ -90,29 +59,17 @@ def get_node_types(node_id1, node_id2, nodes_csv='uploaded_files/csvs_nodes.csv'
     :param nodes_csv: Path to the nodes CSV file.
     :return: A tuple containing the types of the two nodes (type1, type2). If a node is not found, 'Unknown' is returned for its type.
     """
-    node_types = {'Unknown': 'Unknown'}
     try:
-        with open(nodes_csv, mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip header row
-            for row in reader:
-                if len(row) < 2:  # Ensure the row has enough columns
-                    continue
-                node_id = row[0]
-                element_type = row[1]
-                if node_id == node_id1:
-                    node_types['Node1'] = element_type
-                elif node_id == node_id2:
-                    node_types['Node2'] = element_type
-                if 'Node1' in node_types and 'Node2' in node_types:
-                    break
+        store = get_store(nodes_csv=nodes_csv)
     except FileNotFoundError:
         print(f"File {nodes_csv} not found.")
         return 'Unknown', 'Unknown'
 
     # Get the types for the node IDs or default to 'Unknown'
-    type1 = node_types.get('Node1', 'Unknown')
-    type2 = node_types.get('Node2', 'Unknown')
+    node1 = store.get_node(node_id1)
+    node2 = store.get_node(node_id2)
+    type1 = node1.get('Type', 'Unknown') if node1 else 'Unknown'
+    type2 = node2.get('Type', 'Unknown') if node2 else 'Unknown'
     return type1, type2
 
 # Function to generate a unique node ID with the 'GENAINODE' prefix
@@ -120,55 +77,6 @@ def generate_unique_node_id():
     """Generates a unique node ID using UUID."""
     return f"GENAINODE-{uuid.uuid4()}"
 
-def determine_edge_type(element1, element2):
-    """Determines the edge type between two elements based on predefined rules."""
-    # Define the edge type rules
-    edge_rules = {
-        ('instrument', 'instrument'): 'Signal',
-        ('instrument', 'junction'): 'Piping',
-        ('instrument', 'nozzle'): 'Signal',
-        ('instrument', 'piping component'): 'Piping',
-        ('junction', 'instrument'): 'ConnectToProcess',
-        ('junction', 'junction'): 'Piping',
-        ('junction', 'opc'): 'Piping',
-        ('junction', 'piping component'): 'Piping',
-        ('junction', 'unknown'): 'Piping',
-        ('nozzle', 'equipment'): 'DirectConnection',  # Rule for nozzle and equipment
-        ('nozzle', 'instrument'): 'Signal',
-        ('nozzle', 'nozzle'): 'Signal',
-        ('nozzle', 'piping component'): 'Piping',
-        ('opc', 'junction'): 'Piping',
-        ('piping component', 'instrument'): 'Piping',
-        ('piping component', 'junction'): 'Piping',
-        ('piping component', 'nozzle'): 'Piping',
-        ('piping component', 'opc'): 'Piping',
-        ('piping component', 'piping component'): 'Piping',
-        ('pump', 'valve'): 'Piping',
-        ('pump', 'cooler'): 'Piping',
-        ('cooler', 'valve'): 'Direct connection',
-    }
-
-    # Normalize the input order and convert to lowercase, removing spaces
-    element1 = element1.strip().lower()
-    element2 = element2.strip().lower()
-
-    # Debugging: print inputs and normalized key
-    #print(f"element1: '{element1}', element2: '{element2}'")  # Debugging line
-
-    # Create normalized key by sorting elements
-    normalized_key = tuple(sorted([element1, element2]))
-
-    # Debugging: print the normalized key
-    #print(f"Normalized Key: {normalized_key}")  # Debugging line
-
-    # Get the edge type based on the rules
-    edge_type = edge_rules.get(normalized_key, 'Piping')
-
-    # Debugging: print the result
-    #print(f"Edge Type: {edge_type}")  # Debugging line
-
-    return edge_type
-
 def get_edge_type_between_nodes(node_id1, node_id2, nodes_csv='uploaded_files/csvs_nodes.csv'):
     """
     Determines the edge type between two nodes by retrieving their types from the CSV
@@ -188,70 +96,117 @@ def get_edge_type_between_nodes(node_id1, node_id2, nodes_csv='uploaded_files/cs
 # Function to find the existing element in nodes.csv and derive the coordinates
 def find_existing_element(existing_item_tag, nodes_csv):
     """Finds an existing element in the nodes CSV based on the given item tag."""
-    # with open(nodes_csv, 'r') as csvfile:
-    #     reader = csv.DictReader(csvfile)
-    with open(nodes_csv, mode='r') as nodes_file:
-        reader = csv.DictReader(nodes_file)
-        first_column_name = reader.fieldnames[0]
-        
-        for row in reader:
-             # Convert both ItemTag and existing_item_tag to lowercase for case-insensitive comparison
-            if row['ItemTag'].lower() == existing_item_tag.lower():
-                return {
-                    'x': float(row['XCoordinate']),
-                    'y': float(row['YCoordinate']),
-                    'drawing_id': row['DrawingID'],
-                    'id':row[first_column_name]
-                }
-    return None
+    store = get_store(nodes_csv=nodes_csv)
+    # Case-insensitive lookup in the store's tag index
+    row = store.node_by_tag(existing_item_tag)
+    if row is None:
+        return None
+    return {
+        'x': float(row['XCoordinate']),
+        'y': float(row['YCoordinate']),
+        'drawing_id': row['DrawingID'],
+        'id': row[store.node_id_field]
+    }
 
-new_nodes = []
-new_nodes_sub=[]
-#Function to calculate coord sub
-def calculate_new_coordinates_sub(existing_element, nodes_csv, new_nodes_sub, initial_radius=0.01, radius_increment=0.01, max_radius=0.3):
-    """Calculates new coordinates for a new node based on the existing node's position."""
-    existing_x = float(existing_element['x'])
-    existing_y = float(existing_element['y'])
-    radius = initial_radius
-    angle_increment = math.pi / 6
 
-    while radius <= max_radius:
-        for i in range(12):
-            angle = i * angle_increment
-            x_new = existing_x + radius * math.cos(angle)
-            y_new = existing_y + radius * math.sin(angle)
+# Largest number of candidate/obstacle distances computed in one NumPy block
+CANDIDATE_BLOCK_SIZE = 1_000_000
+
 
-            if is_space_available_sub(x_new, y_new, nodes_csv, new_nodes_sub):
-                new_nodes_sub.append((x_new, y_new))  # Track new nodes to avoid overlap in subsequent calls
-                return x_new, y_new
+def ring_candidates(existing_x, existing_y, initial_radius, radius_increment, max_radius, offset_step=0.0):
+    """
+    Generate every candidate position on the placement rings around a node.
+
+    Candidates come in the order the placement loop tries them: 12 angles
+    (30 degrees apart) per ring, rings from initial_radius outwards. Candidate i
+    of a ring is shifted by offset_step * i on both axes.
 
+    Returns:
+        tuple: Two NumPy arrays with the x and y coordinates of the candidates.
+    """
+    radii = []
+    radius = initial_radius
+    while radius <= max_radius:  # Accumulate like the loop did, so the rings are identical
+        radii.append(radius)
         radius += radius_increment
+    steps = np.arange(12)
+    angles = steps * (math.pi / 6)
+    radii = np.array(radii)[:, None]
+    xs = existing_x + radii * np.cos(angles) + offset_step * steps
+    ys = existing_y + radii * np.sin(angles) + offset_step * steps
+    return xs.ravel(), ys.ravel()
 
-    raise ValueError("No available space found near the existing element.")
 
-def is_space_available_sub(x_new, y_new, nodes_csv, new_nodes_sub, threshold=0.05):
-    """Checks if there is enough space to place a new node at the given coordinates."""
-    # Check against existing nodes from the CSV file
-    with open(nodes_csv, 'r') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)
-        for row in reader:
-            if len(row) > 3 and row[2] and row[3]:
-                try:
-                    existing_x = float(row[2])
-                    existing_y = float(row[3])
-                    if math.sqrt((existing_x - x_new) ** 2 + (existing_y - y_new) ** 2) < threshold:
-                        return False
-                except ValueError:
-                    continue
+def first_clear_candidate(xs, ys, obstacles, threshold):
+    """
+    Return the index of the first candidate that is at least threshold away from
+    every obstacle, or None if there is none.
+
+    Distances are computed for whole blocks of candidates at once instead of
+    one candidate at a time.
+    """
+    if len(xs) == 0:
+        return None
+    if len(obstacles) == 0:
+        return 0
+    obstacles = np.asarray(obstacles, dtype=float)
+    obstacle_x, obstacle_y = obstacles[:, 0], obstacles[:, 1]
+    block = max(1, CANDIDATE_BLOCK_SIZE // len(obstacles))
+    for start in range(0, len(xs), block):
+        dx = xs[start:start + block, None] - obstacle_x
+        dy = ys[start:start + block, None] - obstacle_y
+        blocked = (np.sqrt(dx ** 2 + dy ** 2) < threshold).any(axis=1)
+        clear = np.flatnonzero(~blocked)
+        if clear.size:
+            return start + int(clear[0])
+    return None
 
-    # Check against newly added nodes to prevent overlap
-    for (existing_x, existing_y) in new_nodes_sub:
-        if math.sqrt((existing_x - x_new) ** 2 + (existing_y - y_new) ** 2) < threshold:
-            return False
 
-    return True
+def blocked_candidates(xs, ys, obstacles, threshold):
+    """Return a boolean array telling which candidates are closer than threshold to some obstacle."""
+    blocked = np.zeros(len(xs), dtype=bool)
+    if len(obstacles) == 0:
+        return blocked
+    obstacles = np.asarray(obstacles, dtype=float)
+    obstacle_x, obstacle_y = obstacles[:, 0], obstacles[:, 1]
+    block = max(1, CANDIDATE_BLOCK_SIZE // len(obstacles))
+    for start in range(0, len(xs), block):
+        dx = xs[start:start + block, None] - obstacle_x
+        dy = ys[start:start + block, None] - obstacle_y
+        blocked[start:start + block] = (np.sqrt(dx ** 2 + dy ** 2) < threshold).any(axis=1)
+    return blocked
+
+
+def place_on_rings(existing_x, existing_y, store, extra_coordinates, threshold, initial_radius, radius_increment, max_radius, offset_step=0.0, drawing_id=''):
+    """Pick the first free ring candidate around (existing_x, existing_y), or None."""
+    xs, ys = ring_candidates(existing_x, existing_y, initial_radius, radius_increment, max_radius, offset_step)
+    if len(xs) == 0:
+        return None
+    # Only nodes and remembered placements near the rings can block a candidate
+    obstacles = store.placement_obstacles(drawing_id, xs.min() - threshold, ys.min() - threshold,
+                                          xs.max() + threshold, ys.max() + threshold)
+    obstacles.extend(extra_coordinates)
+    index = first_clear_candidate(xs, ys, obstacles, threshold)
+    if index is None:
+        return None
+    return float(xs[index]), float(ys[index])
+
+
+#Function to calculate coord sub
+def calculate_new_coordinates_sub(existing_element, nodes_csv, initial_radius=0.01, radius_increment=0.01, max_radius=0.3, threshold=0.05):
+    """Calculates new coordinates for a new node based on the existing node's position."""
+    existing_x = float(existing_element['x'])
+    existing_y = float(existing_element['y'])
+    store = get_store(nodes_csv=nodes_csv)
+
+    position = place_on_rings(existing_x, existing_y, store, [], threshold,
+                              initial_radius, radius_increment, max_radius, drawing_id=existing_element.get('drawing_id'))
+    if position is None:
+        raise ValueError("No available space found near the existing element.")
 
+    # Remember the position for the drawing to avoid overlap in subsequent calls
+    store.remember_placement(existing_element.get('drawing_id'), *position)
+    return position
 
 def get_connected_nodes(node_id, edges_csv):
     """
@@ -264,73 +219,23 @@ def get_connected_nodes(node_id, edges_csv):
     Returns:
         list: A list of connected node IDs.
     """
-    connected_nodes = []
     try:
-        with open(edges_csv, 'r', encoding='UTF-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header
-            for row in reader:
-                if len(row) >= 2:  # Ensure row has enough columns
-                    if row[0] == node_id or row[1] == node_id:
-                        connected_nodes.append(row[1] if row[0] == node_id else row[0])
+        store = get_store(edges_csv=edges_csv)
     except FileNotFoundError:
         raise FileNotFoundError(f"Edges CSV file '{edges_csv}' not found.")
-    return connected_nodes
+    return store.neighbours(node_id)
 
 
 def get_node_coordinates(node_ids, nodes_csv):
     """Retrieves the coordinates of nodes based on the provided node IDs"""
-    coordinates = []
     try:
-        with open(nodes_csv, 'r') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header
-            for row in reader:
-                if len(row) >= 4 and row[0] in node_ids:
-                    try:
-                        x = float(row[2])
-                        y = float(row[3])
-                        coordinates.append((x, y))
-                    except ValueError:
-                        print(f"Skipping invalid coordinates in row: {row}")
+        store = get_store(nodes_csv=nodes_csv)
     except FileNotFoundError:
         raise FileNotFoundError(f"Nodes CSV file '{nodes_csv}' not found.")
-    return coordinates
-
+    return [store.coords[node_id] for node_id in dict.fromkeys(node_ids) if node_id in store.coords]
 
-def is_space_available(x_new, y_new, nodes_csv, new_nodes, connected_coordinates, threshold=0.05):
-    """Checks if there is enough space to place a new node at the given coordinates."""
-    # Check existing nodes in CSV
-    try:
-        with open(nodes_csv, 'r') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)
-            for row in reader:
-                if len(row) >= 4 and row[2] and row[3]:
-                    try:
-                        existing_x = float(row[2])
-                        existing_y = float(row[3])
-                        if math.sqrt((existing_x - x_new) ** 2 + (existing_y - y_new) ** 2) < threshold:
-                            return False
-                    except ValueError:
-                        continue
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Nodes CSV file '{nodes_csv}' not found.")
 
-    # Check newly added nodes
-    for (existing_x, existing_y) in new_nodes:
-        if math.sqrt((existing_x - x_new) ** 2 + (existing_y - y_new) ** 2) < threshold:
-            return False
-
-    # Check connected nodes to avoid overlapping with them
-    for connected_x, connected_y in connected_coordinates:
-        if math.sqrt((connected_x - x_new) ** 2 + (connected_y - y_new) ** 2) < threshold:
-            return False
-
-    return True
-
-
-def calculate_new_coordinates(existing_element, nodes_csv, edges_csv, new_nodes, initial_radius=0.05, radius_increment=0.05, max_radius=0.5):
+def calculate_new_coordinates(existing_element, nodes_csv, edges_csv, initial_radius=0.05, radius_increment=0.05, max_radius=0.5, threshold=0.05):
     """Calculates new coordinates for a new node based on the existing node's position."""
     try:
         existing_x = float(existing_element['x'])
@@ -338,36 +243,78 @@ def calculate_new_coordinates(existing_element, nodes_csv, edges_csv, new_nodes,
     except (KeyError, ValueError) as e:
         raise ValueError(f"Invalid 'existing_element': {existing_element}. Error: {e}")
 
-    radius = initial_radius
-    angle_increment = math.pi / 6  # 30 degrees
-
     # Find connected nodes
     connected_node_ids = get_connected_nodes(existing_element['id'], edges_csv)
     connected_coordinates = get_node_coordinates(connected_node_ids, nodes_csv)
 
-    while radius <= max_radius:
-        for i in range(12):  # Try 12 points on the current circle
-            angle = i * angle_increment
-            x_new = existing_x + radius * math.cos(angle)
-            y_new = existing_y + radius * math.sin(angle)
+    # Try 12 points per circle, each with a small incremental offset to avoid same X or Y
+    # placement, and keep the first one that is clear of existing, new and connected nodes
+    store = get_store(nodes_csv, edges_csv)
+    drawing_id = existing_element.get('drawing_id')
+    position = place_on_rings(existing_x, existing_y, store, connected_coordinates, threshold,
+                              initial_radius, radius_increment, max_radius, offset_step=0.01, drawing_id=drawing_id)
+    if position is None:
+        raise ValueError("No available space found near the existing element.")
 
-            # Add an offset to avoid same X or Y placement
-            x_new += 0.01 * i  # Small incremental offset
-            y_new += 0.01 * i
+    store.remember_placement(drawing_id, *position)
+    return position
 
-            if is_space_available(x_new, y_new, nodes_csv, new_nodes, connected_coordinates):
-                # Ensure the new node doesn't align too closely with existing ones
-                for (connected_x, connected_y) in connected_coordinates:
-                    if abs(connected_x - x_new) < 0.05 or abs(connected_y - y_new) < 0.05:
-                        continue  # Skip this placement
+def place_nodes_batch(groups, nodes_csv, edges_csv, initial_radius=0.05, radius_increment=0.05, max_radius=0.5, threshold=0.05):
+    """
+    Calculates the coordinates of all new nodes of a prompt in a single pass.
 
-                # If everything checks out, add the node
-                new_nodes.append((x_new, y_new))
-                return x_new, y_new
+    For each anchor the ring candidates and the nearby nodes are loaded once.
+    Its new nodes are then assigned one after another. Each takes the first
+    candidate clear of the drawing, of the anchor's connected nodes and of
+    every node placed before it, so the new nodes keep the same clearance
+    from each other. This gives the same positions as placing them one call
+    at a time.
 
-        radius += radius_increment  # Increase radius if no valid point is found
+    Args:
+        groups (list): (anchor_item_tag, [new_item_tag, ...]) pairs in the order the nodes are added.
+                       An anchor may be a new node of an earlier group.
+        nodes_csv (str): Path to the nodes CSV file.
+        edges_csv (str): Path to the edges CSV file.
 
-    raise ValueError("No available space found near the existing element.")
+    The positions are remembered in the store's placement memory of the
+    anchor's drawing.
+
+    Returns:
+        list: For each group, the list of (x, y) positions of its new nodes.
+    """
+    store = get_store(nodes_csv, edges_csv)
+    batch_positions = {}  # normalized new item tag -> (x, y, drawing ID), for anchors added earlier in the batch
+    positions = []
+
+    for anchor_tag, new_item_tags in groups:
+        if normalize_tag(anchor_tag) in batch_positions:
+            (anchor_x, anchor_y, drawing_id), connected_coordinates = batch_positions[normalize_tag(anchor_tag)], []
+        else:
+            anchor = find_existing_element(anchor_tag, nodes_csv)
+            if anchor is None:
+                raise ValueError(f"Element with item tag {anchor_tag} not found.")
+            anchor_x, anchor_y, drawing_id = anchor['x'], anchor['y'], anchor['drawing_id']
+            connected_coordinates = get_node_coordinates(get_connected_nodes(anchor['id'], edges_csv), nodes_csv)
+
+        xs, ys = ring_candidates(anchor_x, anchor_y, initial_radius, radius_increment, max_radius, offset_step=0.01)
+        obstacles = store.placement_obstacles(drawing_id, xs.min() - threshold, ys.min() - threshold,
+                                              xs.max() + threshold, ys.max() + threshold) if len(xs) else []
+        blocked = blocked_candidates(xs, ys, obstacles + connected_coordinates, threshold)
+
+        group_positions = []
+        for new_item_tag in new_item_tags:
+            clear = np.flatnonzero(~blocked)
+            if not clear.size:
+                raise ValueError("No available space found near the existing element.")
+            x_new, y_new = float(xs[clear[0]]), float(ys[clear[0]])
+            # The new node now blocks the candidates around it for the rest of the batch
+            blocked |= np.sqrt((xs - x_new) ** 2 + (ys - y_new) ** 2) < threshold
+            store.remember_placement(drawing_id, x_new, y_new)
+            batch_positions[normalize_tag(new_item_tag)] = (x_new, y_new, drawing_id)
+            group_positions.append((x_new, y_new))
+        positions.append(group_positions)
+
+    return positions
 
 def check_existing_edge(node1_id, node2_id, edges_csv):
     """
@@ -381,15 +328,8 @@ def check_existing_edge(node1_id, node2_id, edges_csv):
     Returns:
         bool: True if an edge exists between the two nodes (in either direction), False otherwise.
     """
-    # Read all edges from edges.csv
-    with open(edges_csv, mode='r') as csvfile:
-        edges = list(csv.DictReader(csvfile))
-    
     # Check if an edge exists between the two nodes
-    for edge in edges:
-        if (edge['StartNode'] == node1_id and edge['EndNode'] == node2_id) or (edge['StartNode'] == node2_id and edge['EndNode'] == node1_id):
-            return True
-    return False
+    return bool(get_store(edges_csv=edges_csv).edges_between(node1_id, node2_id))
 
 def remove_existing_edge(node1_id, node2_id, edges_csv):
     """
@@ -403,24 +343,12 @@ def remove_existing_edge(node1_id, node2_id, edges_csv):
     Returns:
         The function modifies the CSV file by removing the edge between the two nodes if found.
     """
-    # Read all edges from edges.csv
-    with open(edges_csv, mode='r') as csvfile:
-        edges = list(csv.DictReader(csvfile))
-    
+    store = get_store(edges_csv=edges_csv)
     # Find and remove the edge between the two nodes if it exists
-    edge_to_remove = None
-    for edge in edges:
-        if (edge['StartNode'] == node1_id and edge['EndNode'] == node2_id) or (edge['StartNode'] == node2_id and edge['EndNode'] == node1_id):
-            edge_to_remove = edge
-            break
-    
-    if edge_to_remove:
-        edges.remove(edge_to_remove)
-        # Write the updated edges back to edges.csv
-        with open(edges_csv, mode='w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=edge_to_remove.keys())
-            writer.writeheader()
-            writer.writerows(edges)
+    edges_to_remove = store.edges_between(node1_id, node2_id)
+    if edges_to_remove:
+        with store.operation():
+            store.remove_edge(edges_to_remove[0])
         #print(f"Removed existing edge between {node1_id} and {node2_id}")
 
 # Function to add the new node to the nodes.csv
@@ -456,40 +384,30 @@ def add_bw_node(new_item_tag, nodes_csv, node1_item_tag, node2_item_tag, edges_c
         # return
 
     
-    node_ids = read_node_ids(nodes_csv)  # Read node IDs from the nodes file
+    store = get_store(nodes_csv, edges_csv)
 
-    node1_id = node_ids.get(node1_item_tag, None)  # Get node ID for existing_item_tag
-    node2_id = node_ids.get(node2_item_tag, None) 
+    node1_id = store.node_id_by_tag(node1_item_tag)  # Get node ID for existing_item_tag
+    node2_id = store.node_id_by_tag(node2_item_tag) 
 
     if check_existing_edge(node1_id, node2_id, edges_csv):
         # Remove the existing edge if it exists
         remove_existing_edge(node1_id, node2_id, edges_csv)
 
     new_node_id = generate_unique_node_id()
-    element_type = determine_element_type(new_item_tag)
-    tag_prefix = determine_tag_prefix(new_item_tag)
-    tag_suffix= determine_tag_suffix(new_item_tag)
-    tag_measuredVariable = get_measured_variable_code(new_item_tag)
-    tag_InstrumentTypeModifier = get_instrument_type_modifier(new_item_tag)
-    tag_sequence_no = determine_tag_sequence_no(new_item_tag)
+    tag_info = parse_tag(new_item_tag)
     x_new = (existing_element1['x'] + existing_element2['x']) / 2
     y_new = (existing_element1['y'] + existing_element2['y']) / 2
     drawing_id = existing_element1['drawing_id']
 
-    # Define the empty fields (subtype, tag suffix, etc.)
-    empty_field = ""
-
-    # Append the new node data to the nodes.csv
-    with open(nodes_csv, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            new_node_id, element_type, x_new, y_new, drawing_id,
-            empty_field, new_item_tag, tag_prefix, tag_sequence_no,
-            tag_suffix, tag_measuredVariable, tag_InstrumentTypeModifier, empty_field,
-            empty_field, empty_field
-        ])
+    # Add the new node data to the nodes.csv; the remaining columns (subtype, loop fields, etc.) stay empty
+    with store.operation():
+        store.add_node({
+            store.node_id_field: new_node_id,
+            'XCoordinate': x_new, 'YCoordinate': y_new, 'DrawingID': drawing_id,
+            'ItemTag': new_item_tag, **tag_info.as_row()
+        })
     return {'status':'success','message':'added bw elements'}
-    #print(f"New element added: {new_node_id}, {element_type}, {tag_prefix}-{tag_sequence_no}, x: {x_new}, y: {y_new}, drawing_id: {drawing_id}")
+    #print(f"New element added: {new_node_id}, {tag_info.element_type}, {tag_info.tag_prefix}-{tag_info.tag_sequence_no}, x: {x_new}, y: {y_new}, drawing_id: {drawing_id}")
 
 
 def add_edges(new_item_tag, existing_item_tag, nodes_file_path, edges_file_path):
@@ -512,51 +430,36 @@ def add_edges(new_item_tag, existing_item_tag, nodes_file_path, edges_file_path)
         None: If the edge is successfully added, the function completes without returning anything. 
               Prints an error message if the node IDs are not found.
     """
-    node_ids = read_node_ids(nodes_file_path)  # Read node IDs from the nodes file
+    store = get_store(nodes_file_path, edges_file_path)
 
-    start_node_id = node_ids.get(existing_item_tag, None)  # Get node ID for existing_item_tag
-    end_node_id = node_ids.get(new_item_tag, None)         # Get node ID for new_item_tag
+    start_node_id = store.node_id_by_tag(existing_item_tag)  # Get node ID for existing_item_tag
+    end_node_id = store.node_id_by_tag(new_item_tag)         # Get node ID for new_item_tag
 
     if start_node_id and end_node_id:
-        edge_id = f"GENAIEDGE-{uuid.uuid4()}"  # Generate a unique ID for the edge
-        run_id = str(uuid.uuid4()).replace('-', '').upper()
-        with open(nodes_file_path, mode='r') as nodes_file:
-            nodes_reader = csv.DictReader(nodes_file)
-            existing_node = next((node for node in nodes_reader if node['ItemTag'] == existing_item_tag), None)
-            drawing_id = existing_node['DrawingID'] if existing_node else ''
-
-        # Open the edges file to append the new edge
-        with open(edges_file_path, mode='r') as edges_file:
-            edges_reader = csv.DictReader(edges_file)
-            fieldnames = edges_reader.fieldnames
-
-        # Append the new edge to the edges file
-        with open(edges_file_path, mode='a', newline='') as edges_file:
-            edges_writer = csv.DictWriter(edges_file, fieldnames=fieldnames)
-
-            new_edge = {field: '' for field in fieldnames}  # Start with empty strings for all fields
-
-            if fieldnames[0]:
-                new_edge[fieldnames[0]] = edge_id
-            if 'Type' in fieldnames:
-                new_edge['Type'] = 'Direct Connection'
-            if 'RunID' in fieldnames:
-                new_edge['RunID']=run_id
-            if 'StartNode' in fieldnames:
-                new_edge['StartNode'] = start_node_id
-            if 'EndNode' in fieldnames:
-                new_edge['EndNode'] = end_node_id
-            if 'FlowDir' in fieldnames:
-                new_edge['FlowDir'] = 'StartNode to EndNode'
-            if 'DrawingID' in fieldnames:
-                new_edge['DrawingID'] = drawing_id
-
-            # Write the new edge to the CSV
-            edges_writer.writerow(new_edge)
+        with store.operation():
+            connect_nodes(store, start_node_id, end_node_id)
 
     else:
         print("Error: Could not find node IDs for the given tags.")
 
+def connect_nodes(store, start_node_id, end_node_id):
+    """Add a 'Direct Connection' edge between two nodes of the store, in the drawing of the start node."""
+    edge_id = f"GENAIEDGE-{uuid.uuid4()}"  # Generate a unique ID for the edge
+    run_id = str(uuid.uuid4()).replace('-', '').upper()
+    existing_node = store.get_node(start_node_id)
+    drawing_id = existing_node['DrawingID'] if existing_node else ''
+
+    # Add the new edge; columns that are not set stay empty
+    return store.add_edge({
+        store.edge_id_field: edge_id,
+        'Type': 'Direct Connection',
+        'RunID': run_id,
+        'StartNode': start_node_id,
+        'EndNode': end_node_id,
+        'FlowDir': 'StartNode to EndNode',
+        'DrawingID': drawing_id
+    })
+
 # Function to add the new node to the nodes.csv
 def add_new_node(new_item_tag, nodes_csv, edges_csv, existing_item_tag, offset=(0.05, 0.05)):
     """
@@ -591,43 +494,26 @@ def add_new_node(new_item_tag, nodes_csv, edges_csv, existing_item_tag, offset=(
         #return
 
     new_node_id = generate_unique_node_id()
-    element_type = determine_element_type(new_item_tag)
-    tag_prefix = determine_tag_prefix(new_item_tag)
-    tag_sequence_no = determine_tag_sequence_no(new_item_tag)
-    x_new, y_new = calculate_new_coordinates(existing_element, nodes_csv,edges_csv, new_nodes)
+    tag_info = parse_tag(new_item_tag)
+    x_new, y_new = calculate_new_coordinates(existing_element, nodes_csv,edges_csv)
     drawing_id = existing_element['drawing_id']
-    tag_suffix=determine_tag_suffix(new_item_tag)
-    MeasuredVariableCode=get_measured_variable_code(new_item_tag)
-    InstrumentTypeModifier=get_instrument_type_modifier(new_item_tag)
-
-
-    # Define the empty fields (subtype, tag suffix, etc.)
-    empty_field = ""
-
-    # Append the new node data to the nodes.csv
-    with open(nodes_csv, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            new_node_id, element_type, x_new, y_new, drawing_id,
-            empty_field, new_item_tag, tag_prefix, tag_sequence_no,
-            tag_suffix, MeasuredVariableCode, InstrumentTypeModifier, empty_field,
-            empty_field, empty_field
-        ])
+
+
+    # Add the new node data to the nodes.csv; the remaining columns (subtype, loop fields, etc.) stay empty
+    store = get_store(nodes_csv, edges_csv)
+    with store.operation():
+        store.add_node({
+            store.node_id_field: new_node_id,
+            'XCoordinate': x_new, 'YCoordinate': y_new, 'DrawingID': drawing_id,
+            'ItemTag': new_item_tag, **tag_info.as_row()
+        })
     return {'status':'success','message':f"Added element:{new_item_tag}"}
-    #print(f"New element added: {new_node_id}, {element_type}, {tag_prefix}-{tag_sequence_no}, x: {x_new}, y: {y_new}, drawing_id: {drawing_id}")
+    #print(f"New element added: {new_node_id}, {tag_info.element_type}, {tag_info.tag_prefix}-{tag_info.tag_sequence_no}, x: {x_new}, y: {y_new}, drawing_id: {drawing_id}")
 
 # Function to read node IDs from nodes.csv
 def read_node_ids(file_path):
-    """Read node IDs from the first column of the nodes.csv file."""
-    node_ids = {}
-    with open(file_path, mode='r') as nodes_file:
-        nodes_reader = csv.DictReader(nodes_file)
-        first_column_name = nodes_reader.fieldnames[0]  # Get the first column name
-        for row in nodes_reader:
-            item_tag = row['ItemTag']
-            node_id = row[first_column_name]  # Use the first column as ID
-            node_ids[item_tag] = node_id
-    return node_ids
+    """Read node IDs from the first column of the nodes.csv file, keyed by normalized item tag."""
+    return get_store(nodes_csv=file_path).tag_index()
 
 # Function to handle adding nodes from dict
 def add_nodes_from_dict(add_dict, nodes_csv, edges_csv):
@@ -642,84 +528,55 @@ def add_nodes_from_dict(add_dict, nodes_csv, edges_csv):
     Returns:
         dict: A status message indicating success or failure.
     """
-    with open(nodes_csv, mode='r') as nodes_file:
-        nodes_reader = csv.DictReader(nodes_file)
-        nodes_data = list(nodes_reader)
-    first_column_name = nodes_reader.fieldnames[0] if nodes_reader.fieldnames else None
-    nodes_changed = False
-    
+    store = get_store(nodes_csv, edges_csv)
+    groups = []
+    planned_tags = set()
 
+    # Validate every group first so that nothing is written when one of them fails
     for existing_node_tag, new_node_tags in add_dict.items():
         if not isinstance(new_node_tags, list):
             new_node_tags = [new_node_tags]
-        existing_node = next((node for node in nodes_data if node['ItemTag'] == existing_node_tag), None)
-        if not existing_node:
+        if not store.node_by_tag(existing_node_tag) and normalize_tag(existing_node_tag) not in planned_tags:
             return{'status':'error','message':f'The node with item tag {existing_node_tag} does not exist in the nodes file.'}
-            #print(f"The node with item tag {existing_node_tag} does not exist in the nodes file.")
-            continue
         for new_node_tag in new_node_tags:
             # Check if the new node already exists
-            new_node = next((node for node in nodes_data if node['ItemTag'] == new_node_tag), None)
-            if new_node:
+            if store.node_by_tag(new_node_tag) or normalize_tag(new_node_tag) in planned_tags:
                 return {'status': 'error', 'message': f'The node with item tag {new_node_tag} already exists in the nodes file.'}
-            #     # print(f"Error: The node with item tag {new_node_tag} already exists in the nodes file.")
-            #     # continue
-        for new_node_tag in new_node_tags:
-            new_id = f"GENAINODE-{uuid.uuid4()}"
-            type_of_element = determine_element_type(new_node_tag)
-            tag_prefix = determine_tag_prefix(new_node_tag)
-            tag_sequence_no = determine_tag_sequence_no(new_node_tag)
-            tag_suffix= determine_tag_suffix(new_node_tag)
-            tag_measuredVariable = get_measured_variable_code(new_node_tag)
-            tag_InstrumentTypeModifier = get_instrument_type_modifier(new_node_tag)
-            existing_element = find_existing_element(existing_node_tag, nodes_csv)
-            #print(existing_element)
-            #print(existing_node)
-            x_coordinate, y_coordinate = calculate_new_coordinates(existing_element, nodes_csv,edges_csv,new_nodes)
-            drawing_id = existing_node['DrawingID']
-            new_node = {
-                first_column_name: new_id,
-                'Type': type_of_element,
-                'XCoordinate': x_coordinate,
-                'YCoordinate': y_coordinate,
-                'DrawingID': drawing_id,
-                'ItemTag': new_node_tag,
-                'TagPrefix': tag_prefix,
-                'TagSequenceNo': tag_sequence_no,
-                'TagSuffix':tag_suffix,
-                'MeasuredVariableCode': tag_measuredVariable,
-                'InstrumentTypeModifier':tag_InstrumentTypeModifier
-            }
-            nodes_data.append(new_node)
-            nodes_changed = True
+            planned_tags.add(normalize_tag(new_node_tag))
+        groups.append((existing_node_tag, new_node_tags))
+
+    # Place every new node of the prompt in one pass before adding them
+    positions = place_nodes_batch(groups, nodes_csv, edges_csv)
+
+    nodes_changed = False
+    with store.operation():
+        for (existing_node_tag, new_node_tags), group_positions in zip(groups, positions):
+            existing_node = store.node_by_tag(existing_node_tag)
+            for new_node_tag, (x_coordinate, y_coordinate) in zip(new_node_tags, group_positions):
+                new_id = f"GENAINODE-{uuid.uuid4()}"
+                drawing_id = existing_node['DrawingID']
+                store.add_node({
+                    store.node_id_field: new_id,
+                    'XCoordinate': x_coordinate,
+                    'YCoordinate': y_coordinate,
+                    'DrawingID': drawing_id,
+                    'ItemTag': new_node_tag,
+                    **parse_tag(new_node_tag).as_row()
+                })
+                nodes_changed = True
 
     if nodes_changed:
-        with open(nodes_csv, mode='w', newline='') as nodes_file:
-            fieldnames = nodes_data[0].keys()
-            writer = csv.DictWriter(nodes_file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(nodes_data)
         return {'status':'success','message':'added nodes from dict'}
         #print("Nodes CSV file updated successfully!") 
 
 def read_nodes(file_path):
-    """Read nodes and return a dictionary of item tags mapped to node IDs."""
-    nodes = {}
-    with open(file_path, mode='r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            #print(row.keys())
-            nodes[row['ItemTag'].lower()] = row['ID']
-    return nodes
+    """Read nodes and return a dictionary of normalized item tags mapped to node IDs."""
+    return get_store(nodes_csv=file_path).tag_index()
 
 def get_item_tag_from_node_id(node_id, nodes_file_path):
     """Get the item tag associated with a node ID."""
-    with open(nodes_file_path, mode='r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['ID'] == node_id:
-                return row['ItemTag']
-    return None
+    row = get_store(nodes_csv=nodes_file_path).get_node(node_id)
+    return row['ItemTag'] if row else None
 
 def is_nozzle(node_id, nodes_file_path):
     """
@@ -732,129 +589,184 @@ def is_nozzle(node_id, nodes_file_path):
     Returns:
         bool: True if the node is a nozzle, False otherwise.
     """
-    with open(nodes_file_path, mode='r', encoding='utf-8-sig') as nodes_file:
-        nodes = csv.DictReader(nodes_file)
+    node = get_store(nodes_csv=nodes_file_path).get_node(node_id)
+    return node is not None and node.get('Type', '').lower() == 'nozzle'
 
-        for node in nodes:
-            if node['ID'] == node_id and node.get('Type', '').lower() == 'nozzle':
-                return True
-
-    return False
-
-def is_leaf_node(node_id, edges):
+def is_leaf_node(node_id, edges_file_path):
     """Check if the node is a leaf node (no outgoing or incoming edges)."""
-    for edge in edges:
-        if edge['StartNode'] == node_id or edge['EndNode'] == node_id:
-            return False
-    return True
+    return get_store(edges_csv=edges_file_path).degree(node_id) == 0
 
-def remove_node_and_update_edges(item_tag, nodes_file_path, edges_file_path):
-    """Remove a node and update edges accordingly using item tags."""
-    # Step 1: Read nodes and edges from the files
-    node_ids = read_nodes(nodes_file_path)
+class RemovalPlan:
+    """
+    Everything that removing one or more nodes changes in the workspace.
 
-    # Step 2: Find the node ID associated with the item tag (case-insensitive comparison)
-    node_id_to_remove = node_ids.get(item_tag.lower())  # Case-insensitive lookup in node_ids
+    The plan is worked out from the store's indexes only, then applied in a
+    single operation, so the files are written once however many nodes,
+    nozzles and edges are involved.
+    """
 
-    if not node_id_to_remove:
-        return {'status': 'error', 'message': f'Node with item tag {item_tag} not found.'}
-    
-    node_tag_to_remove = get_item_tag_from_node_id(node_id_to_remove, nodes_file_path)
+    def __init__(self):
+        self.node_ids = {}    # node ID -> None, in the order they are removed
+        self.edge_keys = {}   # edge key -> None
+        self.neighbours = {}  # removed node ID -> its neighbour node IDs, for the nodes whose neighbours are joined up again
+
+    def reconnection_groups(self):
+        """
+        The surviving neighbours to join up, one list per connected group of removed nodes.
+
+        Removed nodes next to each other form one group: the walk goes through
+        removed neighbours, so deleting V-2 and V-3 from V-1 - V-2 - V-3 - V-4
+        joins V-1 and V-4, as deleting them one after the other would.
+        """
+        groups = []
+        seen = set()
+        for start_node_id in self.neighbours:
+            if start_node_id in seen:
+                continue
+            seen.add(start_node_id)
+            pending = [start_node_id]
+            survivors = {}  # node ID -> None, in the order they are found
+            while pending:
+                for neighbour_id in self.neighbours[pending.pop()]:
+                    if neighbour_id in self.neighbours:
+                        if neighbour_id not in seen:
+                            seen.add(neighbour_id)
+                            pending.append(neighbour_id)
+                    elif neighbour_id not in self.node_ids:
+                        survivors[neighbour_id] = None
+            groups.append(list(survivors))
+        return groups
+
+
+def plan_node_removal(store, item_tag, plan=None):
+    """
+    Add the removal of the node with the given item tag to a RemovalPlan.
 
-    if not node_tag_to_remove:
-        return {'status': 'error', 'message': f'ItemTag for Node ID {node_id_to_remove} not found.'}
+    This covers every node carrying the tag and, for a vessel, the nozzles
+    attached to it. It also covers every edge touching those nodes and the
+    neighbours of the node that have to be joined again. The work is
+    proportional to the number of edges of the nodes involved.
 
-    with open(edges_file_path, mode='r', encoding='utf-8-sig') as edges_file:
-        edges = list(csv.DictReader(edges_file))
+    Args:
+        store (GraphStore): The workspace store.
+        item_tag (str): Item tag of the node to remove.
+        plan (RemovalPlan): Plan to extend; a new one is created if omitted.
 
-    node_tag_to_remove = node_tag_to_remove.lower()  # Convert to uppercase for case-insensitive comparison
+    Returns:
+        RemovalPlan: The plan, or None if no node has the item tag.
+    """
+    node_id_to_remove = store.node_id_by_tag(item_tag)  # Case-insensitive lookup in the tag index
+    if not node_id_to_remove:
+        return None
+    plan = plan if plan is not None else RemovalPlan()
 
-    # Step 2: Identify if the node is a vessel
+    # Identify if the node is a vessel; its nozzles go with it
+    node_tag_to_remove = normalize_tag(store.get_node(node_id_to_remove)['ItemTag'])
     is_vessel = node_tag_to_remove.startswith("ves")  # Example condition for identifying vessels.
 
-    # Step 3: Handle nozzles if the node is a vessel
-    nozzles_to_remove = []
-    nozzle_item_tags = []  # List to store item tags of nozzles to remove
-
+    incident_edges = store.edges_of(node_id_to_remove)
+    nozzle_item_tags = []
     if is_vessel:
-        for edge in edges:
-            if edge['StartNode'] == node_id_to_remove and is_nozzle(edge['EndNode'], nodes_file_path):
-                nozzles_to_remove.append(edge['EndNode'])
-                item_tag = get_item_tag_from_node_id(edge['EndNode'], nodes_file_path)
-                if item_tag:
-                    nozzle_item_tags.append(item_tag)
-            elif edge['EndNode'] == node_id_to_remove and is_nozzle(edge['StartNode'], nodes_file_path):
-                nozzles_to_remove.append(edge['StartNode'])
-                item_tag = get_item_tag_from_node_id(edge['StartNode'], nodes_file_path)
-                if item_tag:
-                    nozzle_item_tags.append(item_tag)
-
-    # Read edges from the edges file
-    with open(edges_file_path, mode='r') as edges_file:
-        edges = list(csv.DictReader(edges_file))
-    
-    
-    # Step 2: Check if it's a leaf node
-    if is_leaf_node(node_id_to_remove, edges):
-        # Remove the node if it's a leaf node
-        with open(nodes_file_path, mode='r') as nodes_file:
-            rows = list(csv.DictReader(nodes_file))
-        with open(nodes_file_path, mode='w', newline='') as nodes_file:
-            writer = csv.DictWriter(nodes_file, fieldnames=rows[0].keys())
-            writer.writeheader()
-            writer.writerows(row for row in rows if row['ItemTag'].lower() != item_tag.lower())
-
-        #print(f"Node {item_tag} is a leaf node and has been removed successfully!")
-        return{'status':'success','message':'Deleted successfully'}
-
-    # Step 3: Find all nodes connected to the node to be removed
-    connected_nodes = []
-    for edge in edges:
-        if edge['StartNode'] == node_id_to_remove:
-            connected_nodes.append(edge['EndNode'])
-        elif edge['EndNode'] == node_id_to_remove:
-            connected_nodes.append(edge['StartNode'])
-
-    # Convert connected node IDs to item tags
-    connected_item_tags = [get_item_tag_from_node_id(node_id, nodes_file_path) for node_id in connected_nodes]
-
-    # Step 4: Remove the node from the nodes CSV
-    with open(nodes_file_path, mode='r', encoding='utf-8-sig') as nodes_file:
-        rows = list(csv.DictReader(nodes_file))
-
-    # Create a set of all item tags to remove for efficient filtering
-    item_tags_to_remove = set([item_tag.lower()] + [tag.lower() for tag in nozzle_item_tags])
-
-    with open(nodes_file_path, mode='w', newline='', encoding='utf-8-sig') as nodes_file:
-        writer = csv.DictWriter(nodes_file, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(row for row in rows if row['ItemTag'].lower() not in item_tags_to_remove)
-    
-    #print(f"Node {item_tag} removed successfully!")
+        for edge_key in incident_edges:
+            edge = store.edges[edge_key]
+            other_id = edge['EndNode'] if edge['StartNode'] == node_id_to_remove else edge['StartNode']
+            other = store.get_node(other_id)
+            if other is not None and other.get('Type', '').lower() == 'nozzle' and other.get('ItemTag'):
+                nozzle_item_tags.append(other['ItemTag'])
 
-    # Step 5: Remove edges related to the node from edges CSV
-    remaining_edges = [edge for edge in edges if edge['StartNode'] != node_id_to_remove and edge['EndNode'] != node_id_to_remove]
+    # Every node carrying one of the tags is removed, along with all of its edges
+    for tag in [item_tag] + nozzle_item_tags:
+        for node_id in store.node_ids_by_tag(tag):
+            plan.node_ids[node_id] = None
+            plan.edge_keys.update(dict.fromkeys(store.edges_of(node_id)))
 
-    with open(edges_file_path, mode='w', newline='') as edges_file:
-        writer = csv.DictWriter(edges_file, fieldnames=edges[0].keys())
-        writer.writeheader()
-        writer.writerows(remaining_edges)
+    plan.neighbours[node_id_to_remove] = store.neighbours(node_id_to_remove)
+    return plan
 
-    #print(f"Edges related to {item_tag} removed successfully!")
 
-    # Step 6: Connect remaining nodes
-    if connected_item_tags:
-        start_item_tag = random.choice(connected_item_tags)  # Select a random item tag as the start node
-        remaining_connected_item_tags = [tag for tag in connected_item_tags if tag.lower() != start_item_tag.lower()]
+def apply_removal_plan(store, plan):
+    """
+    Apply a RemovalPlan in one store operation.
 
-        # Debugging: Print the item tags of the nodes being connected
-        #print(f"Connecting nodes: {start_item_tag} with {remaining_connected_item_tags}")
+    After the nodes and edges are dropped, the surviving neighbours of each
+    group of adjacent removed nodes are joined again: one of them, picked at
+    random, is connected to each of the others.
+    """
+    with store.operation():
+        for edge_key in plan.edge_keys:
+            store.remove_edge(edge_key)
+        for node_id in plan.node_ids:
+            store.remove_node(node_id)
+
+        for neighbours in plan.reconnection_groups():
+            survivors = [node_id for node_id in neighbours
+                         if store.get_node(node_id) and store.get_node(node_id).get('ItemTag')]
+            if not survivors:
+                continue
+            start_node_id = random.choice(survivors)  # Select a random neighbour as the start node
+            start_item_tag = normalize_tag(store.get_node(start_node_id)['ItemTag'])
+            for end_node_id in survivors:
+                if normalize_tag(store.get_node(end_node_id)['ItemTag']) != start_item_tag:
+                    connect_nodes(store, start_node_id, end_node_id)
 
-        for new_end_item_tag in remaining_connected_item_tags:
-            add_edges(new_end_item_tag, start_item_tag, nodes_file_path, edges_file_path)
 
-    #print(f"Updated edges after removing node {item_tag}.")
+def remove_node_and_update_edges(item_tag, nodes_file_path, edges_file_path):
+    """Remove a node and update edges accordingly using item tags."""
+    store = get_store(nodes_file_path, edges_file_path)
+    plan = plan_node_removal(store, item_tag)
+    if plan is None:
+        return {'status': 'error', 'message': f'Node with item tag {item_tag} not found.'}
+    apply_removal_plan(store, plan)
     return{'status':'success','message':'Deleted successfully'}
+
+def remove_nodes_and_update_edges(item_tags, nodes_file_path, edges_file_path):
+    """
+    Remove several nodes at once and update edges accordingly using item tags.
+
+    All tags are resolved first; if any of them is unknown nothing is removed.
+    The nozzle cascade and neighbour reconnection apply to the whole set:
+    adjacent removed nodes are reconnected as one group, through their
+    surviving neighbours.
+
+    Args:
+        item_tags (list): Item tags of the nodes to remove.
+        nodes_file_path (str): Path to the nodes CSV file.
+        edges_file_path (str): Path to the edges CSV file.
+
+    Returns:
+        dict: A status message indicating success or failure.
+    """
+    if not item_tags:
+        return {'status': 'error', 'message': 'No item tags to delete.'}
+    store = get_store(nodes_file_path, edges_file_path)
+    missing = [item_tag for item_tag in item_tags if store.node_id_by_tag(item_tag) is None]
+    if missing:
+        return {'status': 'error', 'message': f'Node with item tag {", ".join(missing)} not found.'}
+
+    plan = RemovalPlan()
+    for item_tag in item_tags:
+        plan_node_removal(store, item_tag, plan)
+    apply_removal_plan(store, plan)
+    return {'status': 'success', 'message': f'Deleted {", ".join(item_tags)} successfully'}
+
+def deletion_item_tags(deletions_dict):
+    """
+    Collect the item tags of a 'deletions_dict' from the model response.
+
+    Accepts a single tag, a list of tags or a comma separated string under
+    "Deletion", as well as several keys each holding tags.
+    """
+    item_tags = []
+    for value in deletions_dict.values():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        for item in values:
+            item_tags.extend(tag.strip() for tag in str(item).split(',') if tag.strip())
+    # Keep the first spelling of each tag
+    unique_tags = {}
+    for item_tag in item_tags:
+        unique_tags.setdefault(normalize_tag(item_tag), item_tag)
+    return list(unique_tags.values())
+
 # Function to handle adding edges from dict
 def add_edges_from_dict(add_dict, nodes_file_path, edges_file_path):
     """
@@ -868,34 +780,29 @@ def add_edges_from_dict(add_dict, nodes_file_path, edges_file_path):
     Returns:
         bool: True if edges were added or updated, False otherwise.
     """
-    node_ids = read_node_ids(nodes_file_path)  # Retrieve node information
+    store = get_store(nodes_file_path, edges_file_path)  # Retrieve node information
     edges_changed = False  # Initialize the flag to track if edges are changed
 
-    with open(edges_file_path, mode='r') as edges_file:
-        edges_reader = csv.DictReader(edges_file)
-        fieldnames = edges_reader.fieldnames
-
-    with open(edges_file_path, mode='a', newline='') as edges_file:
-        edges_writer = csv.DictWriter(edges_file, fieldnames=fieldnames)
+    with store.operation():
         for existing_node_tag, new_node_tags in add_dict.items():
             if not isinstance(new_node_tags, list):
                 new_node_tags = [new_node_tags]
-            start_node = node_ids.get(existing_node_tag, None)
+            start_node = store.node_id_by_tag(existing_node_tag)
             for new_node_tag in new_node_tags:
-                end_node = node_ids.get(new_node_tag, None)
+                end_node = store.node_id_by_tag(new_node_tag)
                 if start_node and end_node:
                     edge_id = f"GENAIEDGE-{uuid.uuid4()}"
                     run_id = str(uuid.uuid4()).replace('-', '').upper()
                     new_edge = {
-                        fieldnames[0]: edge_id,
+                        store.edge_id_field: edge_id,
                         'Type': 'Direct Connection',
                         'StartNode': start_node,
                         'RunID':run_id,
                         'EndNode': end_node,
                         'FlowDir': 'StartNode to EndNode',
-                        'DrawingID': node_ids[existing_node_tag]  # Assuming you have DrawingID in node_ids
+                        'DrawingID': store.get_node(start_node)['DrawingID']
                     }
-                    edges_writer.writerow(new_edge)
+                    store.add_edge(new_edge)
                     edges_changed = True  # Set the flag to True when an edge is added
 
     # if edges_changed:
@@ -917,45 +824,28 @@ def swap_node_info(element_1, element_2, nodes_csv):
     :param nodes_csv: Path to the nodes CSV file.
     :return: Dictionary indicating success or error status.
     """
-    rows = []
-    element_1_data = None
-    element_2_data = None
-    node_id_field = None  # To track the first column's name
-
-    # Read the CSV file and find the rows corresponding to the elements
-    with open(nodes_csv, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        fieldnames = reader.fieldnames
-        node_id_field = fieldnames[0]  # First column is NodeID
-
-        for row in reader:
-            if row['ItemTag'] == element_1:
-                element_1_data = row
-            elif row['ItemTag'] == element_2:
-                element_2_data = row
-            rows.append(row)
+    store = get_store(nodes_csv=nodes_csv)
+    node_id_field = store.node_id_field  # First column is NodeID
+
+    # Find the rows corresponding to the elements
+    element_1_id = store.node_id_by_tag(element_1)
+    element_2_id = store.node_id_by_tag(element_2)
 
     # Check if both elements were found
-    if element_1_data is None or element_2_data is None:
+    if element_1_id is None or element_2_id is None or element_1_id == element_2_id:
         return {'status': 'error', 'message': 'One or both elements not found in the CSV.'}
 
     # Swap the information (excluding specific fields)
-    for field in fieldnames:
-        if field not in ['XCoordinate', 'YCoordinate', node_id_field]:
-            element_1_data[field], element_2_data[field] = element_2_data[field], element_1_data[field]
-
-    # Write the updated rows back to the CSV
-    with open(nodes_csv, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            # Update rows with swapped information
-            if row['ItemTag'] == element_1:
-                writer.writerow(element_1_data)
-            elif row['ItemTag'] == element_2:
-                writer.writerow(element_2_data)
-            else:
-                writer.writerow(row)
+    element_1_data = store.get_node(element_1_id)
+    element_2_data = store.get_node(element_2_id)
+    swapped_fields = [field for field in store.node_fields if field not in ['XCoordinate', 'YCoordinate', node_id_field]]
+    element_1_values = {field: element_1_data[field] for field in swapped_fields}
+    element_2_values = {field: element_2_data[field] for field in swapped_fields}
+
+    # Write the swapped information back to the CSV
+    with store.operation():
+        store.update_node(element_1_id, element_2_values)
+        store.update_node(element_2_id, element_1_values)
 
     return {'status': 'success', 'message': 'Information swapped successfully.'}
 
@@ -974,69 +864,71 @@ def update_item_types(csv_file, item_type_updates):
                               - A special case where {"operation": "type", <item_tag>: <new_type>}
                                 updates the 'Type' column for the specified item tag.
     """
-    updated_rows = []
+    store = get_store(nodes_csv=csv_file)
     item_tags_found = []  # Track which item tags were found and updated
 
     # Check if the dictionary contains the special "operation": "type" case
     if "operation" in item_type_updates and item_type_updates["operation"] == "type":
         operation_type_updates = {k: v for k, v in item_type_updates.items() if k != "operation"}
-
-        # Process the items under "operation: type"
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            fieldnames = reader.fieldnames
-            # Ensure 'NominalDiameter' column exists
-            if 'NominalDiameter' not in fieldnames:
-                fieldnames.append('NominalDiameter')
-
-            for row in reader:
-                item_tag = row['ItemTag']
-                if item_tag in operation_type_updates:
-                    # Update the 'Type' column for the item tag
-                    row['Type'] = operation_type_updates[item_tag]
-                    item_tags_found.append(item_tag)
-
-                updated_rows.append(row)
+        # Update the 'Type' column for each item tag
+        updates = {item_tag: {'Type': new_type} for item_tag, new_type in operation_type_updates.items()}
     else:
         # Process regular updates for type, item tags, and sizes
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            fieldnames = reader.fieldnames
-            # Ensure 'NominalDiameter' column exists
-            if 'NominalDiameter' not in fieldnames:
-                fieldnames.append('NominalDiameter')
-
-            for row in reader:
-                item_tag = row['ItemTag']
-                
-                if item_tag in item_type_updates:
-                    new_value = item_type_updates[item_tag]
-                    
-                    if isinstance(new_value, str):  # If the value is a string, assume it's a new item tag
-                        row['Type'] = determine_element_type(new_value)
-                        row['TagPrefix'] = determine_tag_prefix(new_value)
-                        row['TagSequenceNo'] = determine_tag_sequence_no(new_value)
-                        row['ItemTag'] = new_value  # Only update the item tag if the value is a new tag
-                        row['TagSuffix'] = determine_tag_suffix(new_value)
-                        row['MeasuredVariableCode'] = get_measured_variable_code(new_value)
-                        row['InstrumentTypeModifier'] = get_instrument_type_modifier(new_value)
-                    elif isinstance(new_value, (int, float)):  # If the value is a number, assume it's a new size
-                        row['NominalDiameter'] = new_value  # Update the NominalDiameter column
-                    
-                    item_tags_found.append(item_tag)
-
-                updated_rows.append(row)
+        updates = {}
+        for item_tag, new_value in item_type_updates.items():
+            if isinstance(new_value, str):  # If the value is a string, assume it's a new item tag
+                updates[item_tag] = {
+                    **parse_tag(new_value).as_row(),
+                    'ItemTag': new_value,  # Only update the item tag if the value is a new tag
+                }
+            elif isinstance(new_value, (int, float)):  # If the value is a number, assume it's a new size
+                updates[item_tag] = {'NominalDiameter': new_value}  # Update the NominalDiameter column
+            else:
+                updates[item_tag] = {}
+
+    # Resolve every item tag, to all nodes that carry it, before changing anything,
+    # so renames cannot affect later lookups
+    resolved = [(item_tag, node_id) for item_tag in updates for node_id in store.node_ids_by_tag(item_tag)]
 
     # If any item_tag was found and updated, write back to the CSV
-    if item_tags_found:
-        with open(csv_file, 'w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
-            writer.writeheader()
-            writer.writerows(updated_rows)
+    if resolved:
+        with store.operation():
+            # Ensure 'NominalDiameter' column exists
+            store.ensure_node_field('NominalDiameter')
+            old_types = {node_id: store.get_node(node_id).get('Type', '') for _, node_id in resolved}
+            for item_tag, node_id in resolved:
+                store.update_node(node_id, {k: v for k, v in updates[item_tag].items() if k in store.node_fields})
+                item_tags_found.append(item_tag)
+            if item_type_updates.get("operation") == "type":
+                retype_edges(store, old_types)
         return {'status': 'success', 'message': 'Updated'}
     else:
         return {'status': 'error', 'message': 'Elements with given item tags not found'}
 
+def retype_edges(store, old_types):
+    """
+    Re-type the edges at the nodes whose 'Type' changed, given their types before the change.
+
+    Only an edge whose stored type is what the edge rules gave for the old
+    node types is changed; types set otherwise, e.g. the 'Direct Connection'
+    edges the app adds, are kept.
+    """
+    if 'Type' not in store.edge_fields:
+        return
+    changed = [node_id for node_id, old_type in old_types.items() if store.get_node(node_id).get('Type', '') != old_type]
+    edge_keys = list(dict.fromkeys(key for node_id in changed for key in store.edges_of(node_id)))
+    if not edge_keys:
+        return
+    edges = pd.DataFrame([store.edges[key] for key in edge_keys], index=edge_keys, columns=['StartNode', 'EndNode', 'Type'])
+    node_ids = set(edges['StartNode']) | set(edges['EndNode'])
+    new_types = {node_id: store.get_node(node_id).get('Type', '') for node_id in node_ids if store.get_node(node_id)}
+    rule_types_before = assign_edge_types(edges.copy(), {**new_types, **old_types})['Type']
+    rule_types_after = assign_edge_types(edges, new_types)['Type']
+    for edge_key in edge_keys:
+        stored_type = store.edges[edge_key].get('Type')
+        if stored_type == rule_types_before[edge_key] and stored_type != rule_types_after[edge_key]:
+            store.update_edge(edge_key, {'Type': rule_types_after[edge_key]})
+
 def count_row(file_path):
     # Load the existing CSV file
     df = pd.read_csv(file_path)
@@ -1045,70 +937,94 @@ def count_row(file_path):
     #print(f"Updated initial_row_count: {session['initial_row_count']}")
     return session['initial_row_count']
 
+def intern_text(value):
+    """Share one copy of short, often repeated strings such as types and prefixes."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+# Node and Edge use __slots__ and interned strings: large drawings hold hundreds of
+# thousands of them, and a per-instance __dict__ costs more than the values themselves.
 class Node:
+    __slots__ = ('id', 'element_type', 'item_tag', 'x', 'y', 'tag_prefix', 'tag_sequence_no', 'tag_suffix',
+                 'tag_measuredVariable', 'tag_InstrumentTypeModifier', 'drawing_id', 'connections')
+
     def __init__(self, id, element_type, item_tag, x, y, drawing_id, tag_prefix, tag_sequence_no, tag_suffix,tag_measuredVariable,tag_InstrumentTypeModifier):
         self.id = id
-        self.element_type = element_type
+        self.element_type = intern_text(element_type)
         self.item_tag = item_tag
         self.x = x
         self.y = y
-        self.tag_prefix = tag_prefix
+        self.tag_prefix = intern_text(tag_prefix)
         self.tag_sequence_no = tag_sequence_no
-        self.tag_suffix = tag_suffix
-        self.tag_measuredVariable = tag_measuredVariable
-        self.tag_InstrumentTypeModifier = tag_InstrumentTypeModifier
-        self.drawing_id = drawing_id
-        self.connections = []
+        self.tag_suffix = intern_text(tag_suffix)
+        self.tag_measuredVariable = intern_text(tag_measuredVariable)
+        self.tag_InstrumentTypeModifier = intern_text(tag_InstrumentTypeModifier)
+        self.drawing_id = intern_text(drawing_id)
+        self.connections = ()  # Replaced by a list on the first connection
 
     def add_connection(self, edge):
+        if not self.connections:
+            self.connections = []
         self.connections.append(edge)
 
 
 class Edge:
+    __slots__ = ('id', 'run_id', 'start_node', 'end_node', 'flow_dir', 'edge_type')
+
     def __init__(self, id, run_id,start_node, end_node,edge_type, flow_dir='StartNode to EndNode'):
         self.id = id
         self.run_id=run_id
         self.start_node = start_node
         self.end_node = end_node
-        self.flow_dir = flow_dir
-        self.edge_type=edge_type
+        self.flow_dir = intern_text(flow_dir)
+        self.edge_type=intern_text(edge_type)
 
 class Network:
-    def __init__(self):
+    def __init__(self, nodes_csv='uploaded_files/csvs_nodes.csv', edges_csv='uploaded_files/csvs_edges.csv'):
+        self.nodes_csv = nodes_csv
+        self.edges_csv = edges_csv
         self.nodes = {}
         self.edges = {}
+        self.item_tags = {}  # normalized ItemTag -> Node
         self.element_type_counts = {}  # Track element counts
         self.load_nodes_from_csv()
         self.load_edges_from_csv()
+        self.store = get_store(nodes_csv, edges_csv)
+        self.store_version = self.store.version
+
+    def is_current(self, store):
+        """True if nothing changed the workspace since the network was loaded or last changed it."""
+        return store is self.store and store.version == self.store_version
 
     def load_nodes_from_csv(self):
-        with open('uploaded_files/csvs_nodes.csv', mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip header row
-            for row in reader:
-                if len(row) < 7:
-                    continue  # Skip rows that do not have enough columns
-                node_id, element_type, x, y, _, _, item_tag, *_ = row
-                x = float(x) if x else 0.0
-                y = float(y) if y else 0.0
-                tag_prefix = self.get_tag_prefix(element_type)
-                tag_sequence_no = self.get_tag_sequence_no(tag_prefix)
-                tag_suffix= determine_tag_suffix(item_tag)
-                tag_measuredVariable = get_measured_variable_code(item_tag)
-                tag_InstrumentTypeModifier = get_instrument_type_modifier(item_tag)
-                drawing_id = row[4]  # Assuming drawing_id is the 5th column in CSV
-                node = Node(node_id, element_type, item_tag, x, y, drawing_id, tag_prefix, tag_sequence_no,tag_suffix,tag_measuredVariable,tag_InstrumentTypeModifier)
-                self.nodes[node_id] = node
+        # Read through the workspace store, which includes journaled changes not yet in the CSV
+        store = get_store(self.nodes_csv, self.edges_csv)
+        # Derive the tag fields of every node in one vectorized call
+        tag_fields = parse_tags([row.get('ItemTag', '') for row in store.nodes.values()])
+        tag_columns = zip(tag_fields['TagSuffix'], tag_fields['MeasuredVariableCode'], tag_fields['InstrumentTypeModifier'])
+        for (node_id, row), (tag_suffix, tag_measuredVariable, tag_InstrumentTypeModifier) in zip(store.nodes.items(), tag_columns):
+            element_type = row.get('Type', '')
+            item_tag = row.get('ItemTag', '')
+            x = float(row['XCoordinate']) if row.get('XCoordinate') else 0.0
+            y = float(row['YCoordinate']) if row.get('YCoordinate') else 0.0
+            tag_prefix = self.get_tag_prefix(element_type)
+            tag_sequence_no = self.get_tag_sequence_no(tag_prefix)
+            drawing_id = row.get('DrawingID', '')
+            node = Node(node_id, element_type, item_tag, x, y, drawing_id, tag_prefix, tag_sequence_no,tag_suffix,tag_measuredVariable,tag_InstrumentTypeModifier)
+            self.nodes[node_id] = node
+            self.item_tags.setdefault(normalize_tag(item_tag), node)
 
     def load_edges_from_csv(self):
-        with open('uploaded_files/csvs_edges.csv', mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip header row
-            for row in reader:
-                edge_id, run_id, edge_type, start_node, end_node, flow_dir, *_ = row
-                edge_type=get_edge_type_between_nodes(start_node, end_node)
-                edge = Edge(edge_id,run_id, start_node, end_node, edge_type,flow_dir)
-                self.edges[edge_id] = edge
+        store = get_store(self.nodes_csv, self.edges_csv)
+        rows = list(store.edges.items())
+        # Type every edge at once from the node types already loaded, instead of one lookup per edge
+        node_types = {node_id: node.element_type for node_id, node in self.nodes.items()}
+        start_types = [node_types.get(row.get('StartNode', ''), 'Unknown') for _, row in rows]
+        end_types = [node_types.get(row.get('EndNode', ''), 'Unknown') for _, row in rows]
+        edge_types = determine_edge_types(start_types, end_types)
+        for (edge_id, row), edge_type in zip(rows, edge_types):
+            start_node, end_node = row.get('StartNode', ''), row.get('EndNode', '')
+            edge = Edge(edge_id, row.get('RunID', ''), start_node, end_node, edge_type, row.get('FlowDir', ''))
+            self.edges[edge_id] = edge
 
     def generate_item_tag(self, element_type):
         words = element_type.split()
@@ -1140,38 +1056,51 @@ class Network:
 
         existing_element = find_existing_element(starting_item_tag,nodes_csv)
 
-        x, y = calculate_new_coordinates_sub(existing_element, nodes_csv, new_nodes_sub)
+        x, y = calculate_new_coordinates_sub(existing_element, nodes_csv)
         drawing_id = existing_element['drawing_id']
         
         tag_prefix = self.get_tag_prefix(element_type)
         tag_sequence_no = self.get_tag_sequence_no(tag_prefix)
-        tag_suffix= determine_tag_suffix(item_tag)
-        tag_InstrumentTypeModifier = get_instrument_type_modifier(item_tag)
-        tag_measuredVariable = get_measured_variable_code(item_tag)
+        tag_info = parse_tag(item_tag)
+        tag_suffix = tag_info.tag_suffix
+        tag_InstrumentTypeModifier = tag_info.instrument_type_modifier
+        tag_measuredVariable = tag_info.measured_variable_code
         node = Node(node_id, element_type, item_tag, x, y, drawing_id, tag_prefix, tag_sequence_no,tag_suffix,tag_measuredVariable,tag_InstrumentTypeModifier)
         self.nodes[node_id] = node
+        self.item_tags.setdefault(normalize_tag(item_tag), node)
         self.append_node_to_csv(node)
         return node
 
     def add_edge(self, start_node_id, end_node_id, flow_dir='StartNode to EndNode'):
         edge_id = f"GENAIEDGE-{uuid.uuid4()}"
         run_id = str(uuid.uuid4()).replace('-', '').upper()
-        edge_type=get_edge_type_between_nodes(start_node_id, end_node_id)
+        edge_type=get_edge_type_between_nodes(start_node_id, end_node_id, self.nodes_csv)
         edge = Edge(edge_id,run_id, start_node_id, end_node_id,edge_type, flow_dir)
         self.edges[edge_id] = edge
         self.append_edge_to_csv(edge)
         return edge    
 
     def append_node_to_csv(self, node):
-        with open('uploaded_files/csvs_nodes.csv', mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([node.id, node.element_type, node.x, node.y, node.drawing_id, '', 
-                             node.item_tag, node.tag_prefix, node.tag_sequence_no, node.tag_suffix, node.tag_measuredVariable,node.tag_InstrumentTypeModifier,'','',''])
+        store = get_store(self.nodes_csv, self.edges_csv)
+        with store.operation():
+            store.add_node({
+                store.node_id_field: node.id, 'Type': node.element_type,
+                'XCoordinate': node.x, 'YCoordinate': node.y, 'DrawingID': node.drawing_id,
+                'ItemTag': node.item_tag, 'TagPrefix': node.tag_prefix, 'TagSequenceNo': node.tag_sequence_no,
+                'TagSuffix': node.tag_suffix, 'MeasuredVariableCode': node.tag_measuredVariable,
+                'InstrumentTypeModifier': node.tag_InstrumentTypeModifier
+            })
+        # The network already holds the node, so it stays in step with the store
+        self.store_version = store.version
 
     def append_edge_to_csv(self, edge):
-        with open('uploaded_files/csvs_edges.csv', mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([edge.id, edge.run_id, edge.edge_type, edge.start_node, edge.end_node, edge.flow_dir, '', ''])
+        store = get_store(self.nodes_csv, self.edges_csv)
+        with store.operation():
+            store.add_edge({
+                store.edge_id_field: edge.id, 'RunID': edge.run_id, 'Type': edge.edge_type,
+                'StartNode': edge.start_node, 'EndNode': edge.end_node, 'FlowDir': edge.flow_dir
+            })
+        self.store_version = store.version
 
     def add_subnetwork(self, nodes_csv, edges_csv, user_input, starting_item_tag=None):
         subnetwork_structure = self.get_subnetwork_structure(user_input)
@@ -1201,9 +1130,9 @@ class Network:
 
 
     def find_node_by_item_tag(self, item_tag):
-        for node in self.nodes.values():
-            if node.item_tag == item_tag:
-                return node
+        node = self.item_tags.get(normalize_tag(item_tag))
+        if node is not None:
+            return node
         print(f"No node found with item tag: {item_tag}")
         return None
 
@@ -1276,6 +1205,28 @@ class Network:
             return result
 
 
+_networks = {}
+_networks_lock = threading.Lock()
+
+
+def get_network(nodes_csv='uploaded_files/csvs_nodes.csv', edges_csv='uploaded_files/csvs_edges.csv'):
+    """
+    Return the Network of the workspace containing the given CSV files.
+
+    The network is kept between requests and only rebuilt when the workspace
+    was changed by something other than the network itself, e.g. an upload or
+    one of the edit helpers.
+    """
+    store = get_store(nodes_csv, edges_csv)
+    folder = os.path.dirname(store.nodes_csv)
+    with _networks_lock:
+        network = _networks.get(folder)
+        if network is None or not network.is_current(store):
+            network = Network(nodes_csv, edges_csv)
+            _networks[folder] = network
+    return network
+
+
 def get_item_tags_from_csv(nodes_csv):
     """
     Reads item tags from the given CSV file and returns a list of non-empty item tags.
@@ -1288,16 +1239,12 @@ def get_item_tags_from_csv(nodes_csv):
     """
     item_tags = []
 
-    # Open the CSV file
-    with open(nodes_csv, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)  # Read the file as a dictionary
-        
-        # Iterate through each row and extract the item_tag
-        for row in reader:
-            # Assuming the item tag is in the column named "ItemTag"
-            tag = row.get('ItemTag')  # Use .get to avoid KeyError
-            if tag and tag.strip():  # Check if tag is not None or empty
-                item_tags.append(tag.strip())  # Add the cleaned tag to the list
+    # Iterate through each row and extract the item_tag
+    for row in get_store(nodes_csv=nodes_csv).nodes.values():
+        # Assuming the item tag is in the column named "ItemTag"
+        tag = row.get('ItemTag')  # Use .get to avoid KeyError
+        if tag and tag.strip():  # Check if tag is not None or empty
+            item_tags.append(tag.strip())  # Add the cleaned tag to the list
 
     return {'status': 'success', 'message': f'The following ItemTags are present in csv {item_tags}'}
 
@@ -1355,7 +1302,7 @@ If user asks to change only the type of an element, in the updation_dict you nee
 'updation_dict' : { 
 },
 'deletions_dict':{
-"Deletion":<Deletion_itemtag>
+"Deletion":[<Deletion_itemtag>, <Deletion_itemtag>, ...]
 },
 }"
 
@@ -1426,135 +1373,235 @@ response_system_prompt="""You are an AI model designed to assist users with oper
                                 In this case start your response with 'Error:'"politely ask them to provide a relevant prompt related to the PID diagram. Don't give much explanaton just be to point """
 
 
-def get_user_data_give_response(user_prompt, api_key_type):
-    assistant_reply = ""
+# Shorter system_prompt with the same reply formats, for deployments that want fewer input tokens
+compact_system_prompt = """
+You turn requests about a PID diagram into one operation on its CSV files of nodes (elements) and edges (connections).
+Rules:
+- Split elements on "and", commas and full stops; every item tag is distinct. If both a type and an item tag are given, use the item tag.
+- Correct misspelled element types (valve, nozzle, cooler, pump, vessel, sensor, heat exchanger, ...) silently. A pipe is never an element.
+- Adding to a vessel always goes through a nozzle: make it a subnetwork whose first element is a nozzle, even if no nozzle is mentioned.
+- Consider all synonyms of add, remove, update, replace, relocate and swap.
+Reply with only one of these, filled in, and nothing else:
+- Subnetwork (the user asks for connected elements, or says subnetwork):
+Operation: sub_network: Network elements: <elements, comma separated>, existing_item_tag=<item_tag>
+- Subnetwork template given by name:
+Operation: template: <name of template>, existing_item_tag=<existing_item_tag>
+- One new element between two existing elements:
+Operation: B/W 2 elements, NewItemTag: <new_item_tag>, ExistingItemTag1: <existing_item_tag1>, ExistingItemTag2: <existing_item_tag2>,
+- One new element added to one existing element:
+Operation: adding, NewItemTag: <new_item_tag>, ExistingItemTag: <existing_item_tag>
+- Removing one element:
+Operation: deleting, RemoveItemTag: <remove_item_tag>
+- Several operations, or several elements added (a size mentioned with an addition also makes it several operations):
+{
+'addition_dict': {'<existing_item_tag>': ['<new_item_tag>', ...]},
+'updation_dict': {'<item_tag>': <new size as integer> or '<new_item_tag>', ...} (only a type change: {'operation': 'type', '<item_tag>': '<new type>'}),
+'deletions_dict': {'Deletion': ['<item_tag>', ...]},
+}
+- Replacing elements or changing sizes: {'item_type_updates_dict': {'<item_tag>': '<new_item_tag>' or <new size as integer>}}
+- Changing only the type: {'item_type_updates_dict': {'operation': 'type', '<item_tag>': '<new type>'}}
+- Swapping or relocating two elements:
+Relocate_elements: <Item_Tag1>, <Item_Tag2>
+- Asking which item tags or nodes exist:
+<Request for ItemTags>
+"""
 
-    try:
-        if api_key_type == "gemini":
-            genai.configure(api_key=os.getenv("API_KEY"))
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(f"{response_system_prompt}\nUser: {user_prompt}")
-            assistant_reply = response.text.strip()
-
-        elif api_key_type == "azure_openai":
-            from openai import AzureOpenAI
-            azure_oai_endpoint = os.getenv("AZURE_OAI_ENDPOINT")
-            azure_oai_key = os.getenv("AZURE_OAI_KEY")
-            azure_oai_deployment = os.getenv("AZURE_OAI_DEPLOYMENT")
-        
-            client = AzureOpenAI(
-                azure_endpoint=azure_oai_endpoint,
-                api_key=azure_oai_key,
-                api_version="2024-08-01-preview"
-            )
-        
-            messages_array = [
-                {"role": "system", "content": response_system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            
-            response = client.chat.completions.create(
-                model=azure_oai_deployment,
-                temperature=0.7,
-                max_tokens=1200,
-                messages=messages_array
-            )
-            assistant_reply = response.choices[0].message.content
-
-        elif api_key_type == "openai":
-            import openai
-            openai.api_key = os.getenv("api")
-            input_prompt = [
-                {"role": "system", "content": response_system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=input_prompt,
-            )
-
-            assistant_reply = response.choices[0].message['content'].strip()
+# Which system prompt the deployment sends: 'full' or 'compact'
+SYSTEM_PROMPT_VARIANT = os.getenv('SYSTEM_PROMPT_VARIANT', 'full')
+SYSTEM_PROMPTS = {'full': system_prompt, 'compact': compact_system_prompt}
+if SYSTEM_PROMPT_VARIANT not in SYSTEM_PROMPTS:
+    raise ValueError(f"Unknown SYSTEM_PROMPT_VARIANT {SYSTEM_PROMPT_VARIANT!r}; use one of: {', '.join(SYSTEM_PROMPTS)}")
+operation_system_prompt = SYSTEM_PROMPTS[SYSTEM_PROMPT_VARIANT]
+
+# Line that separates the confirmation from the planned operation in a reply to confirmation_system_prompt
+OPERATION_MARKER = "#### OPERATION ####"
+
+# The operation instructions are always the compact ones here, to keep the confirmation prompt short
+confirmation_system_prompt = f"""{response_system_prompt}
+
+After your confirmation, unless it starts with 'Error:', write a line containing only {OPERATION_MARKER}
+and after it the operation for the same user prompt, following exactly the instructions below as if
+they were your only instructions. The user does not see this part.
 
+{compact_system_prompt}"""
+
+# Sampling options per provider for the confirmation and the operation calls; other providers use their defaults
+CONFIRMATION_SAMPLING = {'azure_openai': {'temperature': 0.7, 'max_tokens': 1200}}
+OPERATION_SAMPLING = {'azure_openai': {'temperature': 0.3, 'max_tokens': 2500}}
+
+
+def split_confirmation_reply(assistant_reply):
+    """Split a reply to confirmation_system_prompt into the confirmation text and the operation, or None."""
+    confirmation, marker, operation = assistant_reply.partition(OPERATION_MARKER)
+    operation = operation.strip()
+    return confirmation.strip(), (operation if marker and operation else None)
+
+
+def confirmation_result(user_prompt, api_key_type, confirmation, operation):
+    """The result of get_user_data_give_response for a confirmation and its planned operation (or None)."""
+    # Ensure the response is in a valid JSON format
+    if "Error" in confirmation:
+        return {
+            'result': 'error',
+            'message': f'Model response: {json.dumps({"error": confirmation}, indent=2)}'
+        }
+    else:
+        token = confirmed_operations.remember(user_prompt, api_key_type, operation) if operation else None
+        return {
+            'result': 'success',
+            'message': json.dumps({"response": confirmation}, indent=2),
+            'token': token
+        }
+
+
+def local_intent(user_prompt, nodes_csv=None, edges_csv=None):
+    """The Intent of a simple prompt recognized without the model, or None; needs the workspace files."""
+    if not (nodes_csv or edges_csv):
+        return None
+    intent = parse_intent(get_store(nodes_csv, edges_csv), user_prompt)
+    if intent is not None:
+        logger.debug("Local intent: %s", intent.operation)
+    return intent
+
+
+def get_user_data_give_response(user_prompt, api_key_type, nodes_csv=None, edges_csv=None):
+    """
+    Ask the model to confirm what a prompt will do, and to plan the operation in the same call.
+
+    The operation is kept server-side; the returned 'token' lets
+    get_user_data_and_update_csv run it without asking the model again.
+    The token is None when the model did not give an operation. Given the
+    workspace files, simple prompts are confirmed without the model.
+    """
+    try:
+        intent = local_intent(user_prompt, nodes_csv, edges_csv)
+        if intent is not None:
+            return confirmation_result(user_prompt, api_key_type, intent.confirmation, intent.operation)
+        assistant_reply = complete(api_key_type, confirmation_system_prompt, user_prompt,
+                                   **CONFIRMATION_SAMPLING.get(api_key_type, {}))
         print("Model response:", assistant_reply)
-        
-        # Ensure the response is in a valid JSON format
-        if "Error" in assistant_reply:
-            return {
-                'result': 'error',
-                'message': f'Model response: {json.dumps({"error": assistant_reply}, indent=2)}'
-            }
-        else:
-            return {
-                'result': 'success',
-                'message': json.dumps({"response": assistant_reply}, indent=2)
-            }
+        return confirmation_result(user_prompt, api_key_type, *split_confirmation_reply(assistant_reply))
     except Exception as e:
         return {
             'result': 'error',
             'message': f"Exception occurred: {str(e)}"
         }
- 
-
-def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type):
-    # Modularize client setup based on selected key type
-    if api_key_type == "gemini":
-        genai.configure(api_key=os.getenv("API_KEY"))
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(f"{system_prompt}\nUser: {user_prompt}")
-        assistant_reply = response.text.strip()
-
-    elif api_key_type == "azure_openai":
-        from openai import AzureOpenAI
-        azure_oai_endpoint = os.getenv("AZURE_OAI_ENDPOINT")
-        azure_oai_key = os.getenv("AZURE_OAI_KEY")
-        azure_oai_deployment = os.getenv("AZURE_OAI_DEPLOYMENT")
-    
-        print(azure_oai_endpoint)
-        # Initialize the Azure OpenAI client...
-        client = AzureOpenAI(
-        azure_endpoint = azure_oai_endpoint,
-        api_key=azure_oai_key,  
-        api_version="2024-08-01-preview"
-        )
-    
-        messages_array =  [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-        ]
-            
-        response = client.chat.completions.create(
-                    model=azure_oai_deployment,
-                    temperature=0.3,
-                    max_tokens=2500,
-                    messages=messages_array
-                )
-    
-        assistant_reply = response.choices[0].message.content
 
-    elif api_key_type == "openai":
-        openai.api_key = os.getenv("api")
-        # Using the new API interface
-        input_prompt = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
 
-        # Generate content based on the combined input
+def stream_user_data_give_response(user_prompt, api_key_type, nodes_csv=None, edges_csv=None):
+    """
+    Streaming get_user_data_give_response.
+
+    Yields ('text', piece) for every piece of the confirmation as the model
+    generates it, then one ('result', dict) with what get_user_data_give_response
+    would have returned. The planned operation after OPERATION_MARKER is
+    never yielded as text.
+    """
+    assistant_reply = ""
+    shown = 0  # characters of the confirmation already yielded
+    operation_started = False
+    try:
+        intent = local_intent(user_prompt, nodes_csv, edges_csv)
+        if intent is not None:
+            yield 'text', intent.confirmation
+            yield 'result', confirmation_result(user_prompt, api_key_type, intent.confirmation, intent.operation)
+            return
+        for piece in stream(api_key_type, confirmation_system_prompt, user_prompt,
+                            **CONFIRMATION_SAMPLING.get(api_key_type, {})):
+            assistant_reply += piece
+            if operation_started:
+                continue
+            marker_at = assistant_reply.find(OPERATION_MARKER)
+            operation_started = marker_at != -1
+            # Hold back a tail that might be the start of the marker
+            end = marker_at if operation_started else len(assistant_reply) - len(OPERATION_MARKER) + 1
+            if end > shown:
+                yield 'text', assistant_reply[shown:end]
+                shown = end
+        if not operation_started and shown < len(assistant_reply):
+            yield 'text', assistant_reply[shown:]
+        print("Model response:", assistant_reply)
+        yield 'result', confirmation_result(user_prompt, api_key_type, *split_confirmation_reply(assistant_reply))
+    except Exception as e:
+        yield 'result', {
+            'result': 'error',
+            'message': f"Exception occurred: {str(e)}"
+        }
+
+
+def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type, confirmation_token=None):
+    store = get_store(nodes_csv, edges_csv)
+    cache_key = prompt_cache.key(store, user_prompt, api_key_type)
+
+    # The operation planned when the prompt was confirmed saves a second model call
+    assistant_reply = confirmed_operations.take(confirmation_token, user_prompt, api_key_type)
+    intent = local_intent(user_prompt, nodes_csv, edges_csv) if assistant_reply is None else None
+    new_reply = assistant_reply is not None  # a model reply the cache does not have yet
+    if intent is not None:
+        # Simple prompts are understood locally, without a model call
+        assistant_reply = intent.operation
+    elif assistant_reply is None:
+        # A repeated prompt reuses the model's earlier reply while the item tags it mentions are unchanged
+        assistant_reply = prompt_cache.get(store, cache_key)
+
+    if assistant_reply is None:
+        # The provider's client is created once per process and reused
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=input_prompt,
-                #max_tokens=300
-            )
-
-            # Attempt to access the response text
-            assistant_reply = response.choices[0].message['content'].strip()
+            assistant_reply = complete(api_key_type, operation_system_prompt, user_prompt,
+                                       **OPERATION_SAMPLING.get(api_key_type, {}))
         except Exception as e:
             print(f"An error occurred: {e}")
+            return {'status': 'error', 'message': f"Exception occurred: {str(e)}"}
+        new_reply = True
 
     print("Model response:", assistant_reply)
 
+    # Only a reply that ran successfully is cached; one that failed or raised is asked for again next time.
+    # It is cached with the state of its item tags from before it ran, which a repeated prompt must find again.
+    reply_snapshot = prompt_cache.snapshot(store, assistant_reply)
+    try:
+        result = execute_model_response(assistant_reply, nodes_csv, edges_csv)
+    except Exception:
+        prompt_cache.discard(cache_key)
+        raise
+    if isinstance(result, dict) and result.get('status') == 'success':
+        if new_reply:
+            prompt_cache.put(cache_key, assistant_reply, reply_snapshot)
+    else:
+        prompt_cache.discard(cache_key)
+    return result
+
+
+def execute_model_response(assistant_reply, nodes_csv, edges_csv):
+    """
+    Apply every change of a model response as one transaction.
+
+    The changes are made to the in-memory graph and checked. They are written
+    with one journal append if everything succeeded. If any operation
+    reports an error, raises, or leaves broken edges behind, all of them are
+    rolled back, so a compound prompt is never half-applied.
+
+    Returns:
+        dict: The result of apply_model_response, or the reason the changes were rolled back.
+    """
+    store = get_store(nodes_csv, edges_csv)
+    result = None
+    try:
+        with store.transaction():
+            result = apply_model_response(assistant_reply, nodes_csv, edges_csv)
+            if isinstance(result, dict) and result.get('status') == 'error':
+                raise TransactionAborted(result.get('message', ''))
+            problems = store.pending_problems()
+            if problems:
+                result = {'status': 'error', 'message': ' '.join(problems)}
+                raise TransactionAborted(result['message'])
+    except TransactionAborted:
+        pass
+    return result
+
+
+def apply_model_response(assistant_reply, nodes_csv, edges_csv):
+    """Parse the model's reply and run the operation it describes against the CSV files."""
     # Check if the response indicates an addition or removal
     if "Operation: adding" in assistant_reply:
         # Extract item tags for addition
@@ -1604,7 +1651,7 @@ def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type
             #print(f"Template: {extracted_template}")
             #print(f"Item Tag: {extracted_item_tag}")
             
-            network = Network()
+            network = get_network(nodes_csv, edges_csv)
             result = network.add_subnetwork(nodes_csv, edges_csv, extracted_template, extracted_item_tag)
             if result['status'] == 'error':
                 return result
@@ -1636,7 +1683,7 @@ def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type
             starting_item_tag = network_match.group(2).strip()
             print(extracted_elements)
             print(starting_item_tag)
-            network = Network()
+            network = get_network(nodes_csv, edges_csv)
             result=network.add_subnetwork(nodes_csv,edges_csv, extracted_elements, starting_item_tag)
             if result['status'] == 'error':
                 return result
@@ -1682,10 +1729,10 @@ def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type
         
         # Process additions
         if 'addition_dict' in generated_dict and generated_dict['addition_dict']:
-            result = add_nodes_from_dict(generated_dict['addition_dict'], 'uploaded_files/csvs_nodes.csv', 'uploaded_files/csvs_edges.csv')
+            result = add_nodes_from_dict(generated_dict['addition_dict'], nodes_csv, edges_csv)
             if result['status'] == 'success':
                 success_occurred = True
-                edges_changed = add_edges_from_dict(generated_dict['addition_dict'], 'uploaded_files/csvs_nodes.csv', 'uploaded_files/csvs_edges.csv')
+                edges_changed = add_edges_from_dict(generated_dict['addition_dict'], nodes_csv, edges_csv)
                 if edges_changed:
                     print("Nodes and edges were updated successfully!")
                 else:
@@ -1705,8 +1752,12 @@ def get_user_data_and_update_csv( user_prompt, nodes_csv, edges_csv,api_key_type
         # Process deletions
         if 'deletions_dict' in generated_dict and generated_dict['deletions_dict']:
             del_dict = generated_dict['deletions_dict']
-            remove_item_tag = del_dict.get("Deletion")
-            result = remove_node_and_update_edges(remove_item_tag, nodes_csv, edges_csv)
+            remove_item_tags = deletion_item_tags(del_dict)
+            if len(remove_item_tags) == 1:
+                result = remove_node_and_update_edges(remove_item_tags[0], nodes_csv, edges_csv)
+            else:
+                # Several deletions are planned together and written once; none is an error
+                result = remove_nodes_and_update_edges(remove_item_tags, nodes_csv, edges_csv)
             if result['status'] == 'error':
                 return result
             else: